@@ -0,0 +1,96 @@
+import json
+import os
+import hashlib
+import threading
+
+CACHE_FILE = "analysis_cache.jsonl"
+
+_open_caches = {}
+
+
+def message_key(msg):
+    # Memory node ids are "msg_" + the first 12 hex chars of sha256(content),
+    # so hashing the content again gives the same key for nodes without an id.
+    msg_id = msg.get("id")
+    if msg_id:
+        return msg_id
+    content = msg.get("content", "")
+    return "msg_" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+
+
+class AnalysisCache:
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.offset = 0
+        self.lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            self._refresh()
+
+    def _refresh(self):
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            self.records = {}
+            self.offset = 0
+        if size == self.offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                    self.records[record["id"]] = record
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def add_many(self, records):
+        with self.lock:
+            self._add_many(records)
+
+    def _add_many(self, records):
+        self._refresh()
+        records = [r for r in records if r["id"] not in self.records]
+        if not records:
+            return
+
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        data = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+        with open(self.path, "ab") as f:
+            start = f.tell()
+            f.write(data)
+            # Only skip our own lines on the next refresh if nobody else wrote in between
+            if start == self.offset:
+                self.offset = f.tell()
+        for record in records:
+            self.records[record["id"]] = record
+
+
+def get_cache(folder):
+    path = os.path.join(folder, CACHE_FILE)
+    cache = _open_caches.get(path)
+    if cache is None:
+        cache = AnalysisCache(path)
+        _open_caches[path] = cache
+    else:
+        cache.refresh()
+    return cache
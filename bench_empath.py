@@ -0,0 +1,71 @@
+import argparse
+import json
+import random
+import time
+
+from empath import Empath
+
+from empath_scorer import EmpathScorer
+
+
+def synthetic_texts(lexicon, n, seed):
+    # Mix of lexicon terms, capitalised variants (Empath is case-sensitive),
+    # out-of-vocabulary words and the odd empty message
+    rng = random.Random(seed)
+    terms = sorted({t for words in lexicon.cats.values() for t in words})
+    filler = ["the", "a", "of", "and", "xyzzy", "don't", "ok!", "😀", "\t", "New\nline"]
+    texts = []
+    for _ in range(n):
+        words = rng.choices(terms, k=rng.randint(0, 40)) + rng.choices(filler, k=rng.randint(0, 20))
+        words = [w.capitalize() if rng.random() < 0.1 else w for w in words]
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EmpathScorer against Empath.analyze: exactness and speed")
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lexicon = Empath()
+    start = time.perf_counter()
+    scorer = EmpathScorer(lexicon.cats)
+    build_ms = (time.perf_counter() - start) * 1000
+    texts = synthetic_texts(lexicon, args.texts, args.seed)
+
+    start = time.perf_counter()
+    expected = [(lexicon.analyze(t), lexicon.analyze(t, normalize=True)) for t in texts]
+    empath_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [scorer.score(texts[i:i + args.batch]) for i in range(0, len(texts), args.batch)]
+    scorer_s = time.perf_counter() - start
+
+    mismatches = 0
+    for i, (raw, normalized) in enumerate(expected):
+        counts, norm, tokens = results[i // args.batch]
+        row = i % args.batch
+        if dict(zip(scorer.categories, counts[row].tolist())) != raw:
+            mismatches += 1
+        elif normalized is None:
+            mismatches += bool(tokens[row])
+        elif dict(zip(scorer.categories, norm[row].tolist())) != normalized:
+            mismatches += 1
+
+    print(json.dumps({
+        "texts": len(texts),
+        "batch": args.batch,
+        "build_ms": round(build_ms, 1),
+        # Empath needs two analyze calls to get raw and normalized scores
+        "empath_ms_per_text": round(empath_s * 1000 / len(texts), 4),
+        "scorer_ms_per_text": round(scorer_s * 1000 / len(texts), 4),
+        "speedup": round(empath_s / scorer_s, 1),
+        "mismatches": mismatches,
+    }))
+
+
+if __name__ == "__main__":
+    main()
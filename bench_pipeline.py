@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TASKS = [
+    "collect_user_texts",
+    "analyze_user_bias",
+    "detect_bias_direction",
+    "plot_average_bias_chart",
+    "load_messages_for_room",
+    "export_word_profiles",
+]
+SIDECAR_KEEP = "_log.jsonl"
+
+
+def run_task(task, room, user_id, out_dir):
+    # Returns how many messages the call covered, for throughput
+    import bias_analyzer
+    from log_store import iter_sorted_messages
+
+    if task == "collect_user_texts":
+        return len(bias_analyzer.collect_user_texts(user_id, room))
+    if task == "analyze_user_bias":
+        bias_analyzer.analyze_user_bias(user_id, room)
+        return bias_analyzer.get_user_profile(user_id, room)["messages"]
+    if task == "detect_bias_direction":
+        bias_analyzer.detect_bias_direction(user_id, "positive_emotion", room)
+        return bias_analyzer.get_user_profile(user_id, room)["messages"]
+    if task == "plot_average_bias_chart":
+        with warnings.catch_warnings():
+            # Agg's show() is a no-op that warns about being non-interactive
+            warnings.simplefilter("ignore", UserWarning)
+            bias_analyzer.plot_average_bias_chart(room)
+        return _room_message_count(room)
+    if task == "load_messages_for_room":
+        # What ChatApp.load_messages_for_room does, minus the Tk app around it
+        return len(list(iter_sorted_messages(bias_analyzer.user_log_path(user_id, room))))
+    if task == "export_word_profiles":
+        from embed_input import export_room_word_profiles
+        export_room_word_profiles(room, os.path.join(out_dir, f"{room}_word_profiles.csv"))
+        return _room_message_count(room)
+    raise ValueError(f"unknown task {task}")
+
+
+def _room_message_count(room):
+    from log_store import room_summary
+    return sum(room_summary(room)["users"].values())
+
+
+def child(args):
+    import log_store
+    log_store.LOG_PATH = args.log_path
+    sys.path.insert(0, ROOT)
+
+    start = time.perf_counter()
+    items = run_task(args.child, args.room, args.user, args.out_dir)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    run_task(args.child, args.room, args.user, args.out_dir)
+    warm = time.perf_counter() - start
+    print(json.dumps({
+        "items": items,
+        "cold_s": cold,
+        "warm_s": warm,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def clear_sidecars(log_path):
+    for root, dirs, files in os.walk(log_path):
+        for name in files:
+            if not name.endswith(SIDECAR_KEEP):
+                os.remove(os.path.join(root, name))
+
+
+def prepare_dataset(work_dir, size, users, rooms, length_dist, mean_words, seed):
+    # Generated once per configuration and reused across runs
+    from synthetic_logs import generate_logs, owner_id, user_ids
+    config = {"size": size, "users": users, "rooms": rooms, "length_dist": length_dist,
+              "mean_words": mean_words, "seed": seed}
+    data_dir = os.path.join(work_dir, f"messages_{size}")
+    log_path = os.path.join(data_dir, "memory_logs")
+    marker = os.path.join(data_dir, "dataset.json")
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            ready = json.load(f) == config
+    except (OSError, json.JSONDecodeError):
+        ready = False
+    if not ready:
+        per_user = max(1, size // (users * len(rooms)))
+        generate_logs(log_path, users, per_user, rooms, length_dist, mean_words, seed=seed)
+        clear_sidecars(log_path)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+    return data_dir, log_path, user_ids(owner_id(seed), users)[0]
+
+
+def run_child(task, log_path, room, user_id, out_dir):
+    env = dict(os.environ, MPLBACKEND="Agg")
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", task, "--log-path", log_path,
+                          "--room", room, "--user", user_id, "--out-dir", out_dir],
+                         capture_output=True, text=True, env=env, cwd=out_dir)
+    if out.returncode:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(result, baseline, tolerance):
+    previous = baseline.get((result["size"], result["task"]))
+    if not previous or "cold_s" not in previous or "cold_s" not in result:
+        return
+    ratio = result["cold_s"] / previous["cold_s"] if previous["cold_s"] else None
+    result["baseline_cold_s"] = previous["cold_s"]
+    result["ratio"] = round(ratio, 3) if ratio is not None else None
+    result["regression"] = ratio is not None and ratio > 1 + tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time the analysis pipeline on synthetic memory logs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--tasks", nargs="+", default=TASKS, choices=TASKS)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rooms", nargs="+", default=["room_1"])
+    parser.add_argument("--length-dist", default="lognormal")
+    parser.add_argument("--mean-words", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default="bench_data")
+    parser.add_argument("--cold", action="store_true",
+                        help="drop index/cache sidecars before every task instead of letting tasks share them")
+    parser.add_argument("--output", help="write all results as one JSON document")
+    parser.add_argument("--baseline", help="a previous --output file to flag regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging")
+    parser.add_argument("--child", choices=TASKS, help=argparse.SUPPRESS)
+    parser.add_argument("--log-path", help=argparse.SUPPRESS)
+    parser.add_argument("--room", help=argparse.SUPPRESS)
+    parser.add_argument("--user", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {(r["size"], r["task"]): r for r in json.load(f)["results"]}
+
+    work_dir = os.path.abspath(args.work_dir)
+    results = []
+    for size in args.sizes:
+        start = time.perf_counter()
+        data_dir, log_path, user_id = prepare_dataset(work_dir, size, args.users, args.rooms,
+                                                      args.length_dist, args.mean_words, args.seed)
+        generate_s = time.perf_counter() - start
+        if not args.cold:
+            clear_sidecars(log_path)
+        for task in args.tasks:
+            if args.cold:
+                clear_sidecars(log_path)
+            result = {"size": size, "task": task, "room": args.rooms[0]}
+            result.update(run_child(task, log_path, args.rooms[0], user_id, data_dir))
+            if "items" in result:
+                result["throughput_per_s"] = round(result["items"] / result["cold_s"], 1) if result["cold_s"] else None
+                result["cold_s"] = round(result["cold_s"], 4)
+                result["warm_s"] = round(result["warm_s"], 4)
+                result["peak_rss_mb"] = round(result["peak_rss_mb"], 1)
+            result["generate_s"] = round(generate_s, 2)
+            compare(result, baseline, args.tolerance)
+            results.append(result)
+            print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items()
+                           if k not in ("child", "log_path", "room", "user", "out_dir")},
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+    if any(r.get("regression") for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+import semantic_recall
+from semantic_recall import EMBED_DIM, IVFIndex, get_store, recall
+
+
+def synthetic_vectors(n, dim, clusters, spread, seed):
+    # Gaussian mixture on the unit sphere, roughly how topic-heavy chat embeddings clump
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + spread * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_top_k(vectors, query, k):
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def timed_queries(search, queries):
+    start = time.perf_counter()
+    results = [search(q) for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def bench_log(args):
+    # recall() over a real room log: queries are the first half of random messages, asked
+    # as their sender (how the app uses it) and room-wide, approximate against exact
+    semantic_recall.ANN_MIN_ROWS = min(semantic_recall.ANN_MIN_ROWS, args.min_rows)
+    store = get_store(args.log).update()
+    start = time.perf_counter()
+    store.update_ann()
+    build_s = time.perf_counter() - start
+    rng = np.random.default_rng(args.seed)
+    rows = rng.choice(store.meta["rows"], min(args.queries, store.meta["rows"]), replace=False)
+    queries = []
+    for msg in store.messages(sorted(rows.tolist())):
+        words = msg.get("content", "").split()
+        queries.append((msg.get("user_id"), " ".join(words[:max(1, len(words) // 2)])))
+
+    for scope in ("user", "room"):
+        def ask(query, **kwargs):
+            user_id, text = query
+            return recall(user_id if scope == "user" else None, text, args.k, path=args.log, **kwargs)
+
+        truth, exact_ms = timed_queries(ask, queries)
+        print(json.dumps({"mode": "exact", "scope": scope, "rows": store.meta["rows"],
+                          "ms_per_query": round(exact_ms, 3)}))
+        for nprobe in args.nprobe:
+            results, ms = timed_queries(lambda q: ask(q, approximate=True, nprobe=nprobe), queries)
+            hits = sum(len({m["id"] for s, m in found} & {m["id"] for s, m in expected})
+                       for found, expected in zip(results, truth))
+            print(json.dumps({
+                "mode": "ivf", "scope": scope, "nprobe": nprobe,
+                f"recall@{args.k}": round(hits / max(1, sum(len(e) for e in truth)), 4),
+                "short": sum(len(found) < len(expected) for found, expected in zip(results, truth)),
+                "ms_per_query": round(ms, 3),
+                "speedup": round(exact_ms / ms, 1),
+                "build_s": round(build_s, 1),
+            }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recall@k of the IVF/PQ index against exact search")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--pq-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=1.0, help="noise scale around each cluster centre")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log", help="benchmark recall() on this room log instead of synthetic vectors")
+    parser.add_argument("--min-rows", type=int, default=semantic_recall.ANN_MIN_ROWS,
+                        help="with --log, index logs with at least this many messages")
+    args = parser.parse_args()
+
+    if args.log:
+        bench_log(args)
+        return
+
+    vectors = synthetic_vectors(args.rows + args.queries, EMBED_DIM, args.clusters, args.spread, args.seed)
+    vectors, queries = vectors[:args.rows], vectors[args.rows:]
+
+    truth, exact_ms = timed_queries(lambda q: exact_top_k(vectors, q, args.k), queries)
+    print(json.dumps({"mode": "exact", "rows": args.rows, "ms_per_query": round(exact_ms, 3)}))
+
+    for pq_m in sorted({0, args.pq_m}):
+        start = time.perf_counter()
+        index = IVFIndex(EMBED_DIM, args.nlist, pq_m).train(vectors, seed=args.seed)
+        index.add(vectors, np.arange(len(vectors)))
+        build_s = time.perf_counter() - start
+
+        for refine in ([0, 4, 16] if pq_m else [0]):
+            for nprobe in args.nprobe:
+                rerank = vectors if (refine or not pq_m) else None
+                results, ms = timed_queries(
+                    lambda q: index.search(q, args.k, nprobe, rerank, max(refine, 1))[0], queries)
+                hits = sum(len(np.intersect1d(found, expected)) for found, expected in zip(results, truth))
+                print(json.dumps({
+                    "mode": f"ivf-pq{pq_m}" if pq_m else "ivf-flat",
+                    "refine": refine,
+                    "nlist": index.nlist,
+                    "nprobe": nprobe,
+                    f"recall@{args.k}": round(hits / (args.k * len(queries)), 4),
+                    "ms_per_query": round(ms, 3),
+                    "speedup": round(exact_ms / ms, 1),
+                    "build_s": round(build_s, 1),
+                }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from chat_client import ChatClient
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_server(log_path, queue_size):
+    # The server gets its own process so client and server don't share one GIL
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "chat_server.py"), "--address", "127.0.0.1:0",
+                                "--log-path", log_path, "--queue-size", str(queue_size)],
+                               stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    line = process.stdout.readline().strip()
+    if not line.startswith("listening on "):
+        process.kill()
+        raise RuntimeError(f"chat server failed to start: {line!r}")
+    return process, line[len("listening on "):]
+
+
+def stop_server(process):
+    process.terminate()
+    out, _ = process.communicate(timeout=30)
+    lines = out.strip().splitlines()
+    return json.loads(lines[-1]) if lines else {}
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else None
+
+
+async def run_load(address, clients, rooms, messages, window):
+    # Every client joins one room and sends `messages` nodes; each node carries its send
+    # time so receivers in the same process can measure fan-out latency
+    latencies = []
+    # Deliveries seen per client, and in total at the end
+    seen = [0] * clients
+    done = asyncio.Event()
+    members = [sum(1 for c in range(clients) if c % rooms == r) for r in range(rooms)]
+    expected = sum(members[c % rooms] * messages for c in range(clients))
+
+    def listener(c):
+        def on_event(kind, payload):
+            if kind == "message":
+                latencies.append(time.perf_counter() - payload["sent"])
+                seen[c] += 1
+                if len(latencies) >= expected:
+                    done.set()
+        return on_event
+
+    connections = []
+    for c in range(clients):
+        client = ChatClient(listener(c))
+        await client.connect(address)
+        await client.join(f"room_{c % rooms + 1}")
+        connections.append(client)
+    # Joins are processed in order with sends, but give every join a moment to land first
+    await asyncio.sleep(0.2)
+
+    dropped = []
+    sent = [0]
+
+    async def sender(c, client):
+        room = f"room_{c % rooms + 1}"
+        try:
+            await send_all(c, client, room)
+        except ConnectionError:
+            # The server cut this client off as a slow consumer
+            dropped.append(c)
+
+    async def send_all(c, client, room):
+        for i in range(messages):
+            content = f"load test message {i} from client {c}"
+            node = {"id": f"msg_{c}_{i}", "user_id": f"client_{c}", "username": f"Client {c}", "room": room,
+                    "timestamp": int(time.time()), "content": content, "sent": time.perf_counter()}
+            await client.send(node)
+            sent[0] += 1
+            # Stay at most `window` rounds ahead of what this client has seen delivered
+            # (each round brings one message from every member of its room)
+            while window and i - seen[c] / members[c % rooms] > window:
+                await asyncio.sleep(0.001)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(c, client) for c, client in enumerate(connections)))
+    sent_s = time.perf_counter() - start
+    # Wait for the tail of the fan-out, giving up once deliveries stall
+    delivered = -1
+    while not done.is_set() and len(latencies) > delivered:
+        delivered = len(latencies)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = time.perf_counter() - start
+    for client in connections:
+        await client.close()
+
+    latencies.sort()
+    return {
+        "sent": sent[0],
+        "expected_deliveries": expected,
+        "delivered": len(latencies),
+        "dropped_clients": len(dropped),
+        "send_s": round(sent_s, 3),
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_s": round(sent[0] / elapsed, 1),
+        "deliveries_per_s": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def count_logged(log_path):
+    total = 0
+    for folder, dirs, files in os.walk(log_path):
+        for name in files:
+            if name.endswith("_log.jsonl"):
+                with open(os.path.join(folder, name), "rb") as f:
+                    total += sum(1 for _ in f)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test chat_server with many clients across many rooms")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=200, help="messages sent per client")
+    parser.add_argument("--window", type=int, default=20,
+                        help="how far a client may run ahead of deliveries (0 for no limit)")
+    parser.add_argument("--queue-size", type=int, default=4096)
+    parser.add_argument("--log-path", help="where the server writes room logs (default: a temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = args.log_path or os.path.join(tmp, "memory_logs")
+        process, address = start_server(log_path, args.queue_size)
+        try:
+            result = asyncio.run(run_load(address, args.clients, args.rooms, args.messages, args.window))
+        finally:
+            stats = stop_server(process)
+        result.update({"clients": args.clients, "rooms": args.rooms, "server": stats,
+                       "logged": count_logged(log_path)})
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
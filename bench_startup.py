@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def child(mode):
+    # Runs in a fresh interpreter per sample so nothing is already imported
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    if mode == "eager":
+        # What importing bias_analyzer used to cost before the analyzers were made lazy
+        import pandas
+        import matplotlib.pyplot
+        import matplotlib.backends.backend_tkagg
+        import bias_analyzer
+        bias_analyzer.warm_up()
+    import secure_chat
+    result = {"import_ms": (time.perf_counter() - start) * 1000, "wall_end": time.time()}
+
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print(json.dumps(result))
+        return
+    app = secure_chat.ChatApp(root)
+    root.update()
+    result["window_ms"] = (time.perf_counter() - start) * 1000
+    result["wall_end"] = time.time()
+    print(json.dumps(result))
+    app.jobs.shutdown()
+    root.destroy()
+
+
+def sample(mode):
+    wall_start = time.time()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode],
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    # Includes interpreter start-up, which perf_counter inside the child cannot see
+    result["wall_ms"] = (result.pop("wall_end") - wall_start) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time from launch to the first secure_chat window")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=["eager", "lazy"], choices=["eager", "lazy"])
+    parser.add_argument("--child", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    for mode in args.modes:
+        samples = [sample(mode) for _ in range(args.runs)]
+        report = {"mode": mode, "runs": args.runs}
+        for key in ("import_ms", "window_ms", "wall_ms"):
+            values = [s[key] for s in samples if key in s]
+            if values:
+                report[f"{key}_median"] = round(statistics.median(values), 1)
+                report[f"{key}_min"] = round(min(values), 1)
+        if not any("window_ms" in s for s in samples):
+            report["note"] = "no display available, window not created"
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,470 @@
-import pandas as pd
-import json
 import os
+import json
+import threading
+from collections import namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from empath import Empath
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
-LOG_PATH = "memory_logs"
-lexicon = Empath()
-sentiment_analyzer = SentimentIntensityAnalyzer()
+from analysis_cache import get_cache, message_key
+from instrument import timed, span, count
+import log_store
+from log_store import iter_room_logs, iter_message_chunks, iter_chunks, iter_range, read_messages
+
+def user_log_path(user_id, room="room_1"):
+    # Whichever log of the room the catalogue has this user in (their own folder, an
+    # owner's simulated log, an import, ...); their own folder if there is none yet
+    return log_store.user_room_log(user_id, room) or log_store.room_log_path(user_id, room)
+
+def user_log_folder(user_id, room="room_1"):
+    return os.path.dirname(user_log_path(user_id, room))
+
+BATCH_SIZE = 256
+PROFILE_VERSION = 1
+
+# log path -> running per-user aggregates, mirrored in <room>_log.profiles.json plus
+# the updates appended to <room>_log.profiles.journal since that was written
+_room_profiles = {}
+_profiles_lock = threading.RLock()
+
+# Empath, VADER, pandas and matplotlib are only imported on first use so that
+# importing this module (and opening the chat window) stays cheap
+_models = None
+_models_lock = threading.Lock()
+
+def _load_models():
+    global _models
+    with _models_lock:
+        if _models is None:
+            from empath import Empath
+            from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+            from empath_scorer import EmpathScorer
+            lexicon = Empath()
+            categories = list(lexicon.cats.keys())
+            _models = {
+                "lexicon": lexicon,
+                "scorer": EmpathScorer(lexicon.cats),
+                "sentiment_analyzer": SentimentIntensityAnalyzer(),
+                "categories": categories,
+                "category_index": {cat: i for i, cat in enumerate(categories)},
+            }
+    return _models
+
+def get_lexicon():
+    return (_models or _load_models())["lexicon"]
+
+def get_scorer():
+    return (_models or _load_models())["scorer"]
+
+def get_sentiment_analyzer():
+    return (_models or _load_models())["sentiment_analyzer"]
+
+def get_categories():
+    return (_models or _load_models())["categories"]
+
+def get_category_index():
+    return (_models or _load_models())["category_index"]
+
+_LAZY_NAMES = {
+    "lexicon": get_lexicon,
+    "sentiment_analyzer": get_sentiment_analyzer,
+    "CATEGORIES": get_categories,
+    "CATEGORY_INDEX": get_category_index,
+}
+
+def __getattr__(name):
+    # The old module-level names still resolve for outside callers, just lazily
+    if name in _LAZY_NAMES:
+        return _LAZY_NAMES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up():
+    # Meant for a background thread once the UI is up, so the first Diagnostics
+    # click does not pay for the imports
+    _load_models()
+    import pandas
+    import matplotlib.figure
+
+def iter_user_message_chunks(user_id, room="room_1"):
+    return iter_message_chunks(user_log_path(user_id, room), user_id=user_id)
+
+@timed()
+def collect_user_messages(user_id, room="room_1"):
+    return [msg for chunk in iter_user_message_chunks(user_id, room) for msg in chunk]
 
 def collect_user_texts(user_id, room="room_1"):
-    base_id = user_id.split("_")[0]
-    path = os.path.join(LOG_PATH, f"user_{base_id}", f"{room}_log.jsonl")
-    if not os.path.exists(path):
-        return []
-
-    messages = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                msg = json.loads(line.strip())
-                if msg.get("user_id") == user_id:
-                    messages.append(msg.get("content", ""))
-            except json.JSONDecodeError:
-                continue
-    return messages
+    return [msg.get("content", "") for msg in collect_user_messages(user_id, room)]
 
-def analyze_user_bias(user_id, room="room_1"):
-    texts = collect_user_texts(user_id, room)
-    if not texts:
-        return pd.DataFrame()
+@timed()
+def analyze_texts(texts):
+    # One scorer pass gives both the raw counts and (divided by the token count)
+    # the same normalized vector Empath's analyze(normalize=True) would return.
+    scorer = get_scorer()
+    polarity_scores = get_sentiment_analyzer().polarity_scores
+    count("bias_analyzer.texts_analyzed", len(texts))
+    with span("bias_analyzer.empath_score"):
+        counts, normalized, tokens = scorer.score(texts)
+        sparse_counts = scorer.sparse(counts)
+    with span("bias_analyzer.vader_score"):
+        compounds = [polarity_scores(text)["compound"] for text in texts]
+    records = []
+    for text_counts, n, compound in zip(sparse_counts, tokens.tolist(), compounds):
+        records.append({
+            "counts": text_counts,
+            "empath": {cat: c / n for cat, c in text_counts.items()} if n else None,
+            "compound": compound,
+        })
+    return records
+
+def analyze_text(text):
+    return analyze_texts([text])[0]
+
+@timed()
+def analyze_messages(messages, cache):
+    pending = {}
+    for msg in messages:
+        key = message_key(msg)
+        if key not in cache and key not in pending:
+            pending[key] = msg.get("content", "")
+    if pending:
+        records = analyze_texts(list(pending.values()))
+        for key, record in zip(pending, records):
+            record["id"] = key
+        cache.add_many(records)
+    return [cache.get(message_key(msg)) for msg in messages]
+
+def iter_user_analyses(user_id, room="room_1"):
+    path = user_log_path(user_id, room)
+    cache = get_cache(os.path.dirname(path))
+    for chunk in iter_message_chunks(path, user_id=user_id):
+        yield from analyze_messages(chunk, cache)
+
+def load_user_analyses(user_id, room="room_1"):
+    return list(iter_user_analyses(user_id, room))
+
+def _new_user_profile():
+    n = len(get_categories())
+    return {
+        "messages": 0,
+        "count": 0,
+        "empath": [0.0] * n,
+        "sentiment_sum": [0.0] * n,
+        "sentiment_count": [0] * n,
+    }
+
+def fold_analysis(profile, analysis):
+    category_index = get_category_index()
+    profile["messages"] += 1
+    for cat in analysis["counts"]:
+        j = category_index.get(cat)
+        if j is not None:
+            profile["sentiment_sum"][j] += analysis["compound"]
+            profile["sentiment_count"][j] += 1
+    if analysis["empath"] is not None:
+        profile["count"] += 1
+        for cat, value in analysis["empath"].items():
+            j = category_index.get(cat)
+            if j is not None:
+                profile["empath"][j] += value
+
+def profiles_path(path):
+    return path[:-len(".jsonl")] + ".profiles.json"
 
-    results = [lexicon.analyze(text, normalize=True) for text in texts]
-    df = pd.DataFrame(results)
-    return df.mean().to_frame(name=user_id).T
+def profiles_journal_path(path):
+    return path[:-len(".jsonl")] + ".profiles.journal"
 
-def detect_bias_direction(user_id, category, room="room_1"):
-    texts = collect_user_texts(user_id, room)
-    if not texts:
+def _read_profiles(path):
+    try:
+        with open(profiles_path(path), "r", encoding="utf-8") as f:
+            profiles = json.load(f)
+            profiles["base_size"] = os.fstat(f.fileno()).st_size
+    except (OSError, json.JSONDecodeError):
         return None
+    if profiles.get("version") != PROFILE_VERSION:
+        return None
+
+    # Replay the journal written against this base; lines from an older base or a
+    # torn last line are ignored and overwritten by the next update
+    profiles["journal"] = 0
+    try:
+        with open(profiles_journal_path(path), "rb") as f:
+            for line in f:
+                try:
+                    update = json.loads(line) if line.endswith(b"\n") else None
+                except json.JSONDecodeError:
+                    update = None
+                if not update or update.get("base") != profiles.get("base"):
+                    break
+                profiles["size"] = update["size"]
+                profiles["head"] = update["head"]
+                profiles["users"].update(update["users"])
+                profiles["journal"] += len(line)
+    except OSError:
+        pass
+    return profiles
+
+def _write_profiles(path, profiles, users=None):
+    # Appends just the users an update touched to the journal. The whole file is only
+    # rewritten when the aggregates start over or the journal has outgrown it, so an
+    # update costs about what it changed.
+    journal = profiles_journal_path(path)
+    if users is not None and profiles.get("base") and profiles["journal"] < profiles["base_size"]:
+        update = {"base": profiles["base"], "size": profiles["size"], "head": profiles["head"],
+                  "users": {uid: profiles["users"][uid] for uid in users}}
+        line = (json.dumps(update, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(journal, "r+b" if os.path.exists(journal) else "wb") as f:
+            f.truncate(profiles["journal"])
+            f.seek(0, os.SEEK_END)
+            f.write(line)
+        profiles["journal"] += len(line)
+        return
+
+    # A new base id orphans whatever the journal holds, even if the truncate below
+    # never happens
+    profiles["base"] = os.urandom(8).hex()
+    tmp = profiles_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({key: value for key, value in profiles.items() if key not in ("base_size", "journal")},
+                  f, separators=(",", ":"))
+    os.replace(tmp, profiles_path(path))
+    open(journal, "wb").close()
+    profiles["base_size"] = os.path.getsize(profiles_path(path))
+    profiles["journal"] = 0
+
+@timed()
+def update_room_profiles(path, progress=None):
+    # Folds whatever was appended to the log since the last call into the stored
+    # aggregates; a rewritten log (see log_store.update_index) starts them over.
+    # progress(fraction, message) is called per chunk and may raise to cancel.
+    with _profiles_lock:
+        try:
+            return _update_room_profiles(path, progress)
+        except BaseException:
+            # Half-folded aggregates are dropped; the next call reloads them from disk
+            _room_profiles.pop(path, None)
+            raise
+
+def _update_room_profiles(path, progress=None):
+    categories = get_categories()
+    index = log_store.update_index(path)
+    profiles = _room_profiles.get(path) or _read_profiles(path)
+    if (profiles is None or profiles["categories"] != categories or profiles["size"] > index["size"]
+            or (profiles["size"] and profiles["head"] != index["head"])):
+        profiles = {"version": PROFILE_VERSION, "size": 0, "head": None, "categories": categories, "users": {}}
 
-    relevant_texts = [text for text in texts if category in lexicon.analyze(text, normalize=False)]
-    if not relevant_texts:
+    if profiles["size"] < index["size"]:
+        cache = get_cache(os.path.dirname(path))
+        users = profiles["users"]
+        touched = set()
+        start, end = profiles["size"], index["size"]
+        for chunk in iter_chunks(iter_range(path, start, end, with_offsets=True)):
+            if progress:
+                progress((chunk[0][0] - start) / (end - start), "Analyzing messages")
+            chunk = [msg for offset, msg in chunk]
+            for msg, analysis in zip(chunk, analyze_messages(chunk, cache)):
+                uid = msg.get("user_id")
+                if uid:
+                    fold_analysis(users.setdefault(uid, _new_user_profile()), analysis)
+                    touched.add(uid)
+        # A fresh start (size 0) always writes the whole file
+        fresh = not profiles["size"]
+        profiles["size"] = index["size"]
+        profiles["head"] = index["head"]
+        _write_profiles(path, profiles, None if fresh else touched)
+
+    _room_profiles[path] = profiles
+    return profiles
+
+def get_user_profile(user_id, room="room_1", progress=None):
+    path = user_log_path(user_id, room)
+    if not os.path.exists(path):
         return None
+    return update_room_profiles(path, progress)["users"].get(user_id)
 
-    sentiment_scores = []
-    for text in relevant_texts:
-        score = sentiment_analyzer.polarity_scores(text)["compound"]
-        sentiment_scores.append(score)
+def _profile_from(user_id, room, analyses, progress=None):
+    if analyses is None:
+        return get_user_profile(user_id, room, progress)
+    profile = _new_user_profile()
+    for a in analyses:
+        fold_analysis(profile, a)
+    return profile
 
-    if not sentiment_scores:
+@timed()
+def analyze_user_bias(user_id, room="room_1", analyses=None, progress=None):
+    import pandas as pd
+    profile = _profile_from(user_id, room, analyses, progress)
+    if not profile or not profile["count"]:
+        return pd.DataFrame()
+
+    means = np.array(profile["empath"]) / profile["count"]
+    return pd.DataFrame([means], index=[user_id], columns=get_categories())
+
+@timed()
+def detect_bias_direction(user_id, category, room="room_1", analyses=None):
+    j = get_category_index().get(category)
+    profile = _profile_from(user_id, room, analyses)
+    if j is None or not profile or not profile["sentiment_count"][j]:
         return None
 
-    avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
+    avg_sentiment = profile["sentiment_sum"][j] / profile["sentiment_count"][j]
     return round(avg_sentiment, 4)
 
+RoomBias = namedtuple("RoomBias", ["user_ids", "user_index", "empath", "valid", "sentiment"])
+
+@timed()
+def build_room_bias_matrix(room="room_1", progress=None):
+    user_ids = []
+    user_lookup = {}
+    user_index = []
+    analyses = []
+
+    logs = list(iter_room_logs(room))
+    for i, (folder, path) in enumerate(logs):
+        if progress:
+            progress(i / len(logs), f"Reading {os.path.basename(folder)}")
+        messages = []
+        for msg in read_messages(path):
+            uid = msg.get("user_id")
+            if not uid:
+                continue
+            if uid not in user_lookup:
+                user_lookup[uid] = len(user_ids)
+                user_ids.append(uid)
+            user_index.append(user_lookup[uid])
+            messages.append(msg)
+        analyses.extend(analyze_messages(messages, get_cache(folder)))
+
+    category_index = get_category_index()
+    empath = np.zeros((len(analyses), len(category_index)))
+    valid = np.zeros(len(analyses), dtype=bool)
+    sentiment = np.zeros(len(analyses))
+    for i, a in enumerate(analyses):
+        sentiment[i] = a["compound"]
+        if a["empath"] is None:
+            continue
+        valid[i] = True
+        for cat, value in a["empath"].items():
+            j = category_index.get(cat)
+            if j is not None:
+                empath[i, j] = value
+
+    return RoomBias(user_ids, np.array(user_index, dtype=np.intp), empath, valid, sentiment)
+
+@timed()
+def room_bias_profiles(room_bias):
+    # Per-user mean of the normalized Empath vectors, same values as analyze_user_bias
+    import pandas as pd
+    n_users = len(room_bias.user_ids)
+    sums = np.zeros((n_users, room_bias.empath.shape[1]))
+    np.add.at(sums, room_bias.user_index[room_bias.valid], room_bias.empath[room_bias.valid])
+    counts = np.bincount(room_bias.user_index[room_bias.valid], minlength=n_users)
+
+    has_data = counts > 0
+    means = sums[has_data] / counts[has_data, None]
+    index = [uid for uid, ok in zip(room_bias.user_ids, has_data) if ok]
+    return pd.DataFrame(means, index=index, columns=get_categories())
+
+@timed()
+def room_bias_directions(room_bias):
+    # Per-user, per-category mean compound sentiment over the messages mentioning the
+    # category, i.e. detect_bias_direction before rounding (NaN where it returns None)
+    import pandas as pd
+    n_users = len(room_bias.user_ids)
+    present = room_bias.empath > 0
+    sums = np.zeros((n_users, present.shape[1]))
+    counts = np.zeros((n_users, present.shape[1]))
+    np.add.at(sums, room_bias.user_index, present * room_bias.sentiment[:, None])
+    np.add.at(counts, room_bias.user_index, present)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        directions = sums / counts
+    return pd.DataFrame(directions, index=room_bias.user_ids, columns=get_categories())
+
+def _analyze_batch(items):
+    # Runs in a pool worker: each process imports this module once and reuses its
+    # own scorer and VADER instances for every batch it is handed
+    records = analyze_texts([text for key, text in items])
+    for (key, text), record in zip(items, records):
+        record["id"] = key
+    return records
+
+def _profiled_size(path):
+    # How much of the log the stored profiles already cover; everything before that
+    # was analyzed (and cached) when it was folded in
+    index = log_store.update_index(path)
+    profiles = _room_profiles.get(path) or _read_profiles(path)
+    if profiles is None or profiles["size"] > index["size"] or profiles["head"] != index["head"]:
+        return 0, index["size"]
+    return profiles["size"], index["size"]
+
+def _iter_uncached(paths, batch_size):
+    for path in paths:
+        start, end = _profiled_size(path)
+        if start >= end:
+            continue
+        cache = get_cache(os.path.dirname(path))
+        seen = set()
+        batch = []
+        chunks = iter_chunks(iter_range(path, start, end)) if start else iter_message_chunks(path)
+        for chunk in chunks:
+            for msg in chunk:
+                key = message_key(msg)
+                if key in cache or key in seen:
+                    continue
+                seen.add(key)
+                batch.append((key, msg.get("content", "")))
+                if len(batch) >= batch_size:
+                    yield cache, batch
+                    batch = []
+        if batch:
+            yield cache, batch
+
+@timed()
+def prefetch_analyses(rooms=("room_1",), workers=None, batch_size=BATCH_SIZE):
+    paths = [path for room in rooms for folder, path in iter_room_logs(room)]
+    prefetch_log_analyses(paths, workers, batch_size)
+
+@timed()
+def prefetch_log_analyses(paths, workers=None, batch_size=BATCH_SIZE):
+    # Analyzes each distinct uncached message once and stores it in the folder's cache
+    workers = workers or os.cpu_count() or 1
+    batches = _iter_uncached(paths, batch_size)
+    if workers == 1:
+        for cache, batch in batches:
+            cache.add_many(_analyze_batch(batch))
+        return
+
+    # Keep a bounded number of batches in flight so huge rooms never queue up in memory
+    with log_store.process_pool(workers) as pool:
+        pending = {}
+        for cache, batch in batches:
+            pending[pool.submit(_analyze_batch, batch)] = cache
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future).add_many(future.result())
+        for future in list(pending):
+            pending.pop(future).add_many(future.result())
+
+def analyze_room_parallel(room="room_1", user_ids=None, workers=None):
+    prefetch_analyses([room], workers)
+    profiles = room_bias_profiles(build_room_bias_matrix(room))
+    if user_ids is not None:
+        profiles = profiles.loc[[uid for uid in user_ids if uid in profiles.index]]
+    return profiles
+
 def sentiment_to_color(sentiment):
     sentiment = max(min(sentiment, 1), -1)
     red = (1 - sentiment) / 2
     green = (1 + sentiment) / 2
     return (red, green, 0.2)
 
-def plot_radar_chart(user_id, room="room_1"):
-    df = analyze_user_bias(user_id, room)
-    if df.empty:
-        print("No data to visualize.")
-        return
-
-    top_categories = df.loc[user_id].sort_values(ascending=False).head(10)
-    categories = top_categories.index.tolist()
-    values = top_categories.tolist()
-
+@timed()
+def draw_radar(fig, categories, values, colors, title):
     angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
-    values += values[:1]
+    values = values + values[:1]
     angles += angles[:1]
 
-    sentiments = [detect_bias_direction(user_id, cat, room) or 0.0 for cat in categories]
-    colors = [sentiment_to_color(s) for s in sentiments]
-
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
+    ax = fig.add_subplot(projection="polar")
 
     for i in range(len(categories)):
         ax.plot([angles[i], angles[i + 1]], [values[i], values[i + 1]], color=colors[i], linewidth=3)
@@ -91,57 +475,118 @@ def plot_radar_chart(user_id, room="room_1"):
 
     ax.set_xticks(angles[:-1])
     ax.set_xticklabels(categories, fontsize=9)
-    ax.set_title(f"Top 10 Bias Traits (Color = Sentiment): {user_id}")
-    plt.tight_layout()
-    plt.show()
+    ax.set_title(title)
+    fig.tight_layout()
+    return ax
 
-def plot_average_bias_chart(room="room_1"):
-    all_user_ids = set()
-    for root, dirs, files in os.walk(LOG_PATH):
-        for file in files:
-            if file == f"{room}_log.jsonl":
-                with open(os.path.join(root, file), "r", encoding="utf-8") as f:
-                    for line in f:
-                        try:
-                            msg = json.loads(line.strip())
-                            all_user_ids.add(msg.get("user_id"))
-                        except:
-                            continue
-
-    all_profiles = []
-    for uid in all_user_ids:
-        df = analyze_user_bias(uid, room)
-        if not df.empty:
-            all_profiles.append(df)
-
-    if not all_profiles:
-        print("No user data found.")
-        return
+@timed()
+def radar_chart_data(user_id, room="room_1", progress=None):
+    df = analyze_user_bias(user_id, room, progress=progress)
+    if df.empty:
+        return None
 
-    avg_df = pd.concat(all_profiles).mean().to_frame(name="Average").T
-    top_categories = avg_df.loc["Average"].sort_values(ascending=False).head(10)
+    top_categories = df.loc[user_id].sort_values(ascending=False).head(10)
     categories = top_categories.index.tolist()
     values = top_categories.tolist()
 
-    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
-    values += values[:1]
-    angles += angles[:1]
+    sentiments = [detect_bias_direction(user_id, cat, room) or 0.0 for cat in categories]
+    colors = [sentiment_to_color(s) for s in sentiments]
+    return categories, values, colors
+
+@timed()
+def room_profile_frames(room="room_1", progress=None):
+    # room_bias_profiles and room_bias_directions from the stored per-user aggregates:
+    # after the first call only newly appended messages are analyzed, and the frames
+    # themselves cost O(users) rather than a pass over every message in the room
+    import pandas as pd
+    merged = {}
+    logs = log_store.room_logs(room)
+    for i, (folder, path) in enumerate(logs):
+        if progress:
+            progress(i / len(logs), f"Updating {os.path.basename(folder)}")
+        # Scale this log's per-chunk progress into its share of the room
+        log_progress = progress and (lambda f, message, i=i: progress((i + f) / len(logs), message))
+        for uid, profile in update_room_profiles(path, log_progress)["users"].items():
+            total = merged.setdefault(uid, _new_user_profile())
+            total["count"] += profile["count"]
+            total["empath"] = np.add(total["empath"], profile["empath"])
+            total["sentiment_sum"] = np.add(total["sentiment_sum"], profile["sentiment_sum"])
+            total["sentiment_count"] = np.add(total["sentiment_count"], profile["sentiment_count"])
 
-    sentiments = [detect_bias_direction(uid, cat, room) or 0.0 for cat in categories for uid in all_user_ids]
-    avg_sentiments = [np.mean([detect_bias_direction(uid, cat, room) or 0.0 for uid in all_user_ids]) for cat in categories]
+    user_ids = list(merged)
+    categories = get_categories()
+
+    def stack(field):
+        return np.array([merged[uid][field] for uid in user_ids], dtype=float).reshape(len(user_ids), len(categories))
+
+    counts = np.array([merged[uid]["count"] for uid in user_ids])
+    has_data = counts > 0
+    profiles = pd.DataFrame(stack("empath")[has_data] / counts[has_data, None],
+                            index=[uid for uid, ok in zip(user_ids, has_data) if ok], columns=categories)
+
+    sums = stack("sentiment_sum")
+    hits = stack("sentiment_count")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        directions = pd.DataFrame(sums / hits, index=user_ids, columns=categories)
+    return profiles, directions
+
+@timed()
+def average_chart_data(room="room_1", progress=None):
+    profiles, directions = room_profile_frames(room, progress)
+    if profiles.empty:
+        return None
+
+    avg_df = profiles.mean().to_frame(name="Average").T
+    top_categories = avg_df.loc["Average"].sort_values(ascending=False).head(10)
+    categories = top_categories.index.tolist()
+    values = top_categories.tolist()
+
+    avg_sentiments = directions[categories].fillna(0.0).mean().tolist()
     colors = [sentiment_to_color(s) for s in avg_sentiments]
+    return categories, values, colors
 
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
+# build_*_figure use a bare Figure (no pyplot state) so they are safe to call off the
+# Tk thread; the caller embeds the result in a FigureCanvasTkAgg or saves it
+@timed()
+def build_radar_figure(user_id, room="room_1", progress=None):
+    data = radar_chart_data(user_id, room, progress)
+    if data is None:
+        return None
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(6, 6))
+    draw_radar(fig, *data, f"Top 10 Bias Traits (Color = Sentiment): {user_id}")
+    return fig
 
-    for i in range(len(categories)):
-        ax.plot([angles[i], angles[i + 1]], [values[i], values[i + 1]], color=colors[i], linewidth=3)
-        ax.fill_between([angles[i], angles[i + 1]], 0, [values[i], values[i + 1]], color=colors[i], alpha=0.3)
+@timed()
+def build_average_bias_figure(room="room_1", progress=None):
+    data = average_chart_data(room, progress)
+    if data is None:
+        return None
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(6, 6))
+    draw_radar(fig, *data, "Average Bias Traits (Color = Sentiment)")
+    return fig
 
-    ax.plot([angles[-2], angles[0]], [values[-2], values[0]], color=colors[-1], linewidth=3)
-    ax.fill_between([angles[-2], angles[0]], 0, [values[-2], values[0]], color=colors[-1], alpha=0.3)
+@timed()
+def plot_radar_chart(user_id, room="room_1"):
+    data = radar_chart_data(user_id, room)
+    if data is None:
+        print("No data to visualize.")
+        return
 
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(categories, fontsize=9)
-    ax.set_title(f"Average Bias Traits (Color = Sentiment)")
-    plt.tight_layout()
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(6, 6))
+    draw_radar(fig, *data, f"Top 10 Bias Traits (Color = Sentiment): {user_id}")
+    plt.show()
+
+@timed()
+def plot_average_bias_chart(room="room_1"):
+    data = average_chart_data(room)
+    if data is None:
+        print("No user data found.")
+        return
+
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(6, 6))
+    draw_radar(fig, *data, "Average Bias Traits (Color = Sentiment)")
     plt.show()
@@ -0,0 +1,325 @@
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+import log_store
+from log_store import iter_room_logs, iter_chunks, iter_range
+from analysis_cache import get_cache
+from bias_analyzer import analyze_messages, get_categories, get_category_index, user_log_path
+
+TRENDS_VERSION = 1
+BUCKET_SECONDS = 3600
+RESOLUTIONS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+# Everything is summed per (user, hour) so any window or coarser resolution is a
+# merge of buckets rather than a rescan of messages:
+#   buckets: messages, count (messages with Empath scores), compound sum
+#   cells:   per (user, hour, category) normalized Empath sum and the compound
+#            sum/count over messages mentioning the category; only non-empty cells
+#            are stored, which keeps hourly buckets sparse
+BUCKET_FIELDS = ("messages", "count", "sentiment")
+CELL_FIELDS = ("empath", "sentiment_sum", "sentiment_count")
+
+# times: bucket starts (epoch seconds); empath/directions: DataFrames of per-category
+# means and mean compound per bucket; sentiment/messages: per-bucket Series
+Timeline = namedtuple("Timeline", ["times", "empath", "directions", "sentiment", "messages"])
+
+_room_trends = {}
+_trends_lock = threading.RLock()
+
+
+def trends_path(path):
+    return path[:-len(".jsonl")] + ".trends.npz"
+
+
+def _reduce(keys, values):
+    # Sorts rows by keys and sums the values of rows sharing the same keys
+    order = np.lexsort(keys[::-1])
+    keys = [k[order] for k in keys]
+    values = [v[order] for v in values]
+    if not len(order):
+        return keys, values
+    change = np.zeros(len(order), dtype=bool)
+    change[0] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(change)
+    return [k[starts] for k in keys], [np.add.reduceat(v, starts) for v in values]
+
+
+class TrendBuckets:
+    def __init__(self, categories):
+        self.categories = categories
+        self.size = 0
+        self.head = None
+        self.users = []
+        self.user_lookup = {}
+        self.bucket_keys = [np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)]
+        self.buckets = [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)]
+        self.cell_keys = [np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)]
+        self.cells = [np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64)]
+        self.pending = []
+
+    def add(self, messages, analyses):
+        category_index = get_category_index()
+        b_user, b_time, b_messages, b_count, b_sentiment = [], [], [], [], []
+        c_user, c_time, c_cat, c_empath, c_sum = [], [], [], [], []
+        for msg, a in zip(messages, analyses):
+            uid = msg.get("user_id")
+            ts = msg.get("timestamp")
+            if not uid or not isinstance(ts, (int, float)):
+                continue
+            user = self.user_lookup.setdefault(uid, len(self.user_lookup))
+            if user == len(self.users):
+                self.users.append(uid)
+            hour = int(ts) // BUCKET_SECONDS * BUCKET_SECONDS
+            b_user.append(user)
+            b_time.append(hour)
+            b_messages.append(1)
+            b_count.append(a["empath"] is not None)
+            b_sentiment.append(a["compound"])
+            empath = a["empath"] or {}
+            for cat in a["counts"]:
+                j = category_index.get(cat)
+                if j is not None:
+                    c_user.append(user)
+                    c_time.append(hour)
+                    c_cat.append(j)
+                    c_empath.append(empath.get(cat, 0.0))
+                    c_sum.append(a["compound"])
+
+        # Each chunk is reduced on its own and merged into the totals once by merge(),
+        # so a long update does not re-sort everything seen so far on every chunk
+        self.pending.append((
+            _reduce([np.array(b_user, dtype=np.int32), np.array(b_time, dtype=np.int64)],
+                    [np.array(b_messages, dtype=np.int64), np.array(b_count, dtype=np.int64),
+                     np.array(b_sentiment, dtype=np.float64)]),
+            _reduce([np.array(c_user, dtype=np.int32), np.array(c_time, dtype=np.int64),
+                     np.array(c_cat, dtype=np.int32)],
+                    [np.array(c_empath, dtype=np.float64), np.array(c_sum, dtype=np.float64),
+                     np.ones(len(c_cat), dtype=np.int64)]),
+        ))
+
+    def merge(self):
+        if not self.pending:
+            return
+        bucket_runs = [self.bucket_keys + self.buckets] + [keys + values for (keys, values), cells in self.pending]
+        cell_runs = [self.cell_keys + self.cells] + [keys + values for buckets, (keys, values) in self.pending]
+        self.pending = []
+        bucket_columns = [np.concatenate(column) for column in zip(*bucket_runs)]
+        cell_columns = [np.concatenate(column) for column in zip(*cell_runs)]
+        self.bucket_keys, self.buckets = _reduce(bucket_columns[:2], bucket_columns[2:])
+        self.cell_keys, self.cells = _reduce(cell_columns[:3], cell_columns[3:])
+
+    def save(self, path):
+        arrays = {
+            "state": np.array([TRENDS_VERSION, self.size], dtype=np.int64),
+            "head": np.array(self.head or ""),
+            "categories": np.array(self.categories),
+            "users": np.array(self.users, dtype=str),
+        }
+        for name, values in zip(("b_user", "b_time"), self.bucket_keys):
+            arrays[name] = values
+        for name, values in zip(BUCKET_FIELDS, self.buckets):
+            arrays[f"b_{name}"] = values
+        for name, values in zip(("c_user", "c_time", "c_cat"), self.cell_keys):
+            arrays[name] = values
+        for name, values in zip(CELL_FIELDS, self.cells):
+            arrays[f"c_{name}"] = values
+        tmp = trends_path(path) + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, trends_path(path))
+
+    @classmethod
+    def load(cls, path, categories):
+        try:
+            data = np.load(trends_path(path))
+        except (OSError, ValueError):
+            return None
+        with data:
+            version, size = (int(v) for v in data["state"])
+            if version != TRENDS_VERSION or data["categories"].tolist() != categories:
+                return None
+            trends = cls(categories)
+            trends.size = size
+            trends.head = str(data["head"]) or None
+            trends.users = data["users"].tolist()
+            trends.user_lookup = {uid: i for i, uid in enumerate(trends.users)}
+            trends.bucket_keys = [data["b_user"], data["b_time"]]
+            trends.buckets = [data[f"b_{name}"] for name in BUCKET_FIELDS]
+            trends.cell_keys = [data["c_user"], data["c_time"], data["c_cat"]]
+            trends.cells = [data[f"c_{name}"] for name in CELL_FIELDS]
+        return trends
+
+
+def update_room_trends(path, progress=None):
+    # Same incremental scheme as update_room_profiles: fold the bytes appended since
+    # the last call, start over if the log was truncated or rewritten
+    with _trends_lock:
+        try:
+            return _update_room_trends(path, progress)
+        except BaseException:
+            _room_trends.pop(path, None)
+            raise
+
+
+def _update_room_trends(path, progress=None):
+    categories = get_categories()
+    index = log_store.update_index(path)
+    trends = _room_trends.get(path) or TrendBuckets.load(path, categories)
+    if (trends is None or trends.size > index["size"]
+            or (trends.size and trends.head != index["head"])):
+        trends = TrendBuckets(categories)
+
+    if trends.size < index["size"]:
+        cache = get_cache(os.path.dirname(path))
+        start, end = trends.size, index["size"]
+        for chunk in iter_chunks(iter_range(path, start, end, with_offsets=True)):
+            if progress:
+                progress((chunk[0][0] - start) / (end - start), "Updating time buckets")
+            chunk = [msg for offset, msg in chunk]
+            trends.add(chunk, analyze_messages(chunk, cache))
+        trends.merge()
+        trends.size = index["size"]
+        trends.head = index["head"]
+        trends.save(path)
+
+    _room_trends[path] = trends
+    return trends
+
+
+def _resolution_seconds(resolution):
+    return RESOLUTIONS[resolution] if isinstance(resolution, str) else int(resolution)
+
+
+def _collect(paths, user_id, start, end, step, progress=None):
+    # Merges the matching buckets of every log into dense [time x category] sums
+    parts = {"b_time": [], "buckets": [[] for _ in BUCKET_FIELDS],
+             "c_time": [], "c_cat": [], "cells": [[] for _ in CELL_FIELDS]}
+    for i, path in enumerate(paths):
+        log_progress = progress and (lambda f, message, i=i: progress((i + f) / len(paths), message))
+        trends = update_room_trends(path, log_progress)
+        b_mask = np.ones(len(trends.bucket_keys[1]), dtype=bool)
+        c_mask = np.ones(len(trends.cell_keys[1]), dtype=bool)
+        if user_id is not None:
+            code = trends.user_lookup.get(user_id, -1)
+            b_mask &= trends.bucket_keys[0] == code
+            c_mask &= trends.cell_keys[0] == code
+        # A bucket belongs to the window if its hour starts inside it
+        if start is not None:
+            b_mask &= trends.bucket_keys[1] >= start // BUCKET_SECONDS * BUCKET_SECONDS
+            c_mask &= trends.cell_keys[1] >= start // BUCKET_SECONDS * BUCKET_SECONDS
+        if end is not None:
+            b_mask &= trends.bucket_keys[1] <= end
+            c_mask &= trends.cell_keys[1] <= end
+        parts["b_time"].append(trends.bucket_keys[1][b_mask] // step * step)
+        for values, bucket in zip(parts["buckets"], trends.buckets):
+            values.append(bucket[b_mask])
+        parts["c_time"].append(trends.cell_keys[1][c_mask] // step * step)
+        parts["c_cat"].append(trends.cell_keys[2][c_mask])
+        for values, cell in zip(parts["cells"], trends.cells):
+            values.append(cell[c_mask])
+
+    n_categories = len(get_categories())
+    b_time = np.concatenate(parts["b_time"]) if paths else np.zeros(0, dtype=np.int64)
+    if not len(b_time):
+        return np.zeros(0, dtype=np.int64), [np.zeros(0)] * len(BUCKET_FIELDS), \
+            [np.zeros((0, n_categories))] * len(CELL_FIELDS)
+
+    times = np.arange(b_time.min(), b_time.max() + step, step, dtype=np.int64)
+    rows = (b_time - times[0]) // step
+    buckets = [np.bincount(rows, weights=np.concatenate(v), minlength=len(times)) for v in parts["buckets"]]
+    cell_rows = (np.concatenate(parts["c_time"]) - times[0]) // step
+    cell_cats = np.concatenate(parts["c_cat"])
+    cells = []
+    for values in parts["cells"]:
+        dense = np.zeros((len(times), n_categories))
+        np.add.at(dense, (cell_rows, cell_cats), np.concatenate(values))
+        cells.append(dense)
+    return times, buckets, cells
+
+
+def _rolling(values, window):
+    # Trailing sum over `window` rows, on a dense time axis
+    if window <= 1:
+        return values
+    total = np.cumsum(values, axis=0)
+    total[window:] = total[window:] - total[:-window]
+    return total
+
+
+def _room_paths(user_id, room):
+    if user_id is None:
+        return [path for folder, path in iter_room_logs(room)]
+    path = user_log_path(user_id, room)
+    return [path] if os.path.exists(path) else []
+
+
+def bias_timeline(user_id=None, room="room_1", resolution="day", start=None, end=None, window=1, progress=None):
+    # Per-bucket Empath means and sentiment for one user (or the whole room when
+    # user_id is None). window > 1 makes each point the mean over the trailing
+    # `window` buckets, weighted by message count like analyze_user_bias.
+    import pandas as pd
+    step = _resolution_seconds(resolution)
+    times, (messages, count, sentiment), (empath, sentiment_sum, sentiment_count) = \
+        _collect(_room_paths(user_id, room), user_id, start, end, step, progress)
+    messages, count, sentiment = (_rolling(v, window) for v in (messages, count, sentiment))
+    empath, sentiment_sum, sentiment_count = (_rolling(v, window) for v in (empath, sentiment_sum, sentiment_count))
+
+    index = pd.to_datetime(times, unit="s")
+    categories = get_categories()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        empath_means = empath / count[:, None]
+        directions = sentiment_sum / sentiment_count
+        sentiment_means = sentiment / messages
+    return Timeline(
+        times,
+        pd.DataFrame(empath_means, index=index, columns=categories),
+        pd.DataFrame(directions, index=index, columns=categories),
+        pd.Series(sentiment_means, index=index, name="sentiment"),
+        pd.Series(messages.astype(np.int64), index=index, name="messages"),
+    )
+
+
+def rolling_bias(user_id=None, room="room_1", window=7, resolution="day", start=None, end=None):
+    return bias_timeline(user_id, room, resolution, start, end, window)
+
+
+def windowed_user_bias(user_id, room="room_1", start=None, end=None):
+    # analyze_user_bias restricted to [start, end], to hour-bucket precision
+    import pandas as pd
+    times, (messages, count, sentiment), (empath, sentiment_sum, sentiment_count) = \
+        _collect(_room_paths(user_id, room), user_id, start, end, BUCKET_SECONDS)
+    total = count.sum()
+    if not total:
+        return pd.DataFrame()
+    return pd.DataFrame([empath.sum(axis=0) / total], index=[user_id], columns=get_categories())
+
+
+def build_trend_figure(user_id=None, room="room_1", resolution="day", window=7, top=5, progress=None):
+    from matplotlib.figure import Figure
+    timeline = bias_timeline(user_id, room, resolution, window=window, progress=progress)
+    if not len(timeline.times) or not timeline.messages.sum():
+        return None
+
+    overall = timeline.empath.mul(timeline.messages, axis=0).sum()
+    categories = overall.sort_values(ascending=False).head(top).index.tolist()
+
+    fig = Figure(figsize=(8, 6))
+    ax_bias, ax_sentiment = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+    for cat in categories:
+        ax_bias.plot(timeline.empath.index, timeline.empath[cat], label=cat, linewidth=2)
+    ax_bias.set_ylabel("Empath score")
+    ax_bias.legend(fontsize=8, loc="upper left")
+    label = user_id or room
+    ax_bias.set_title(f"Bias Trend ({window}-{resolution} rolling): {label}")
+
+    ax_sentiment.plot(timeline.sentiment.index, timeline.sentiment, color="gray", linewidth=2)
+    ax_sentiment.axhline(0, color="black", linewidth=0.5)
+    ax_sentiment.set_ylim(-1, 1)
+    ax_sentiment.set_ylabel("Sentiment")
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return fig
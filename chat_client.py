@@ -0,0 +1,194 @@
+import asyncio
+import json
+import queue
+import threading
+
+from chat_server import LINE_LIMIT, encode, parse_address
+
+
+class ChatClient:
+    # The asyncio end of a connection; messages and errors go to on_event(kind, payload)
+    def __init__(self, on_event):
+        self.on_event = on_event
+        self.reader = None
+        self.writer = None
+        self.listener = None
+        # Set once connect() finishes either way, so requests made meanwhile wait for it
+        self.ready = asyncio.Event()
+
+    async def connect(self, address):
+        host, port = parse_address(address)
+        try:
+            if port is None:
+                self.reader, self.writer = await asyncio.open_unix_connection(host, limit=LINE_LIMIT)
+            else:
+                self.reader, self.writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+        finally:
+            self.ready.set()
+        self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("op") == "message":
+                    self.on_event("message", message["node"])
+                else:
+                    self.on_event("error", message.get("error", "unknown server error"))
+        except (ConnectionError, ValueError) as e:
+            self.on_event("error", str(e))
+        self.on_event("closed", None)
+
+    async def request(self, message):
+        await self.ready.wait()
+        if self.writer is None or self.writer.is_closing():
+            raise ConnectionError("not connected to a chat server")
+        self.writer.write(encode(message))
+        # Waits while the server is behind, so a fast sender can't queue unbounded data
+        await self.writer.drain()
+
+    async def join(self, room):
+        await self.request({"op": "join", "room": room})
+
+    async def leave(self, room):
+        await self.request({"op": "leave", "room": room})
+
+    async def send(self, node):
+        await self.request({"op": "send", "node": node})
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        if self.listener:
+            await self.listener
+
+
+class ChatBridge:
+    # Runs a ChatClient on its own event loop thread for the Tk app. Calls are safe from
+    # the Tk thread; received nodes are handed back there in batches through root.after,
+    # the same way JobExecutor reports job events. Sent nodes count as delivered once the
+    # server echoes them back; any still unconfirmed when a send fails or the connection
+    # ends go to on_undelivered so the caller can keep them.
+    def __init__(self, root, on_messages, on_error=None, on_undelivered=None, poll_ms=50):
+        self.root = root
+        self.on_messages = on_messages
+        self.on_error = on_error
+        self.on_undelivered = on_undelivered
+        self.poll_ms = poll_ms
+        self.events = queue.Queue()
+        self.client = ChatClient(lambda kind, payload: self.events.put((kind, payload)))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="chat-bridge", daemon=True)
+        self.thread.start()
+        self.connected = False
+        self.connecting = False
+        self.unconfirmed = {}
+        self.polling = None
+
+    def _call(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self._check)
+        return future
+
+    def _check(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.events.put(("error", str(future.exception())))
+
+    def connect(self, address, rooms=()):
+        async def start():
+            await self.client.connect(address)
+            for room in rooms:
+                await self.client.join(room)
+        future = self._call(start())
+        future.add_done_callback(self._connect_done)
+        # connected is only set by _poll once the connection is actually up
+        self.connecting = True
+        self.polling = self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def _connect_done(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.events.put(("closed", None))
+        else:
+            self.events.put(("connected", None))
+
+    def join(self, room):
+        return self._call(self.client.join(room))
+
+    def leave(self, room):
+        return self._call(self.client.leave(room))
+
+    def send(self, node):
+        key = _node_key(node)
+        self.unconfirmed[key] = node
+        future = self._call(self.client.send(node))
+        future.add_done_callback(lambda f: self._send_done(f, key))
+        return future
+
+    def _send_done(self, future, key):
+        if future.cancelled() or future.exception() is not None:
+            self.events.put(("undelivered", key))
+
+    def close(self):
+        if self.polling:
+            self.root.after_cancel(self.polling)
+            self.polling = None
+        if self.connected or self.connecting:
+            self.connected = False
+            self.connecting = False
+            try:
+                asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result(timeout=2)
+            except Exception as e:
+                print(f"Error closing chat connection: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        # Echoes that were still on their way are lost with the connection
+        self._poll_events()
+        self._undelivered(list(self.unconfirmed))
+
+    def _poll(self):
+        self._poll_events()
+        self.polling = self.root.after(self.poll_ms, self._poll) if self.connected or self.connecting else None
+
+    def _poll_events(self):
+        nodes = []
+        failed = []
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "message":
+                self.unconfirmed.pop(_node_key(payload), None)
+                nodes.append(payload)
+            elif kind == "connected":
+                self.connected = True
+                self.connecting = False
+            elif kind == "undelivered":
+                failed.append(payload)
+            elif kind == "closed":
+                self.connected = False
+                self.connecting = False
+                failed.extend(self.unconfirmed)
+            elif self.on_error:
+                self.on_error(payload)
+        if nodes:
+            self.on_messages(nodes)
+        self._undelivered(failed)
+
+    def _undelivered(self, keys):
+        nodes = [self.unconfirmed.pop(key) for key in dict.fromkeys(keys) if key in self.unconfirmed]
+        if nodes and self.on_undelivered:
+            self.on_undelivered(nodes)
+
+
+def _node_key(node):
+    # The server relays nodes unchanged, so these identify a node's own echo
+    return node.get("id"), node.get("user_id"), node.get("timestamp")
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import re
+import signal
+
+import log_store
+from log_store import get_writer, room_log_path, close_writers
+from instrument import count
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SERVER_ID = "server"
+# Messages a subscriber may have queued before it counts as a slow consumer
+QUEUE_SIZE = 4096
+LINE_LIMIT = 1 << 20
+# Room names end up in file names, so keep them to something path-safe
+ROOM_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Newline-delimited JSON in both directions.
+# client -> server: {"op": "join"|"leave", "room": r}, {"op": "send", "node": memory node}
+# server -> client: {"op": "message", "node": node}, {"op": "error", "error": text}
+
+
+def encode(message):
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+def parse_address(address):
+    # "host:port" for TCP, anything else is a Unix socket path
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or DEFAULT_HOST, int(port)
+    return address, None
+
+
+class Subscriber:
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.rooms = set()
+        self.closed = False
+        self.aborted = False
+
+    def offer(self, data):
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def pump(self):
+        # Coalesces whatever is queued into one write, then waits for the socket to drain
+        try:
+            while True:
+                chunks = [await self.queue.get()]
+                while not self.queue.empty():
+                    chunks.append(self.queue.get_nowait())
+                if chunks[-1] is None:
+                    chunks.pop()
+                    self.writer.write(b"".join(chunks))
+                    await self.writer.drain()
+                    self.writer.close()
+                    return
+                self.writer.write(b"".join(chunks))
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            # Let the pump send what is already queued and stop
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self.abort()
+
+    def abort(self):
+        self.closed = True
+        self.aborted = True
+        self.writer.transport.abort()
+
+
+class ChatServer:
+    def __init__(self, owner=SERVER_ID, queue_size=QUEUE_SIZE):
+        self.owner = owner
+        self.queue_size = queue_size
+        self.rooms = {}
+        self.clients = set()
+        self.pending = {}
+        self.flush_scheduled = False
+        self.server = None
+        self.stats = {"clients": 0, "received": 0, "delivered": 0, "rejected": 0, "slow_consumers": 0}
+
+    def log_path(self, room):
+        return room_log_path(self.owner, room)
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        if port is None:
+            self.server = await asyncio.start_unix_server(self.handle, host, limit=LINE_LIMIT)
+            return host
+        self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            for client in list(self.clients):
+                client.close()
+            await self.server.wait_closed()
+        self.flush()
+        close_writers()
+
+    async def handle(self, reader, writer):
+        client = Subscriber(writer, self.queue_size)
+        pump = asyncio.create_task(client.pump())
+        self.clients.add(client)
+        self.stats["clients"] += 1
+        try:
+            while not client.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    request = None
+                error = self.dispatch(client, request)
+                if error:
+                    self.stats["rejected"] += 1
+                    client.offer(encode({"op": "error", "error": error}))
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than LINE_LIMIT
+            pass
+        finally:
+            self.clients.discard(client)
+            self.stats["clients"] -= 1
+            for room in client.rooms:
+                self.rooms.get(room, set()).discard(client)
+            client.close()
+            if client.aborted:
+                pump.cancel()
+            try:
+                await pump
+            except asyncio.CancelledError:
+                pass
+            writer.close()
+
+    def dispatch(self, client, request):
+        if not isinstance(request, dict):
+            return "expected a JSON object"
+        op = request.get("op")
+        if op == "send":
+            node = request.get("node")
+            if not isinstance(node, dict) or not isinstance(node.get("content"), str) or "user_id" not in node:
+                return "send needs a memory node with user_id and content"
+            if not ROOM_PATTERN.match(str(node.get("room", ""))):
+                return f"bad room {node.get('room')!r}"
+            self.publish(node)
+        elif op in ("join", "leave"):
+            room = request.get("room")
+            if not ROOM_PATTERN.match(str(room or "")):
+                return f"bad room {room!r}"
+            if op == "join":
+                client.rooms.add(room)
+                self.rooms.setdefault(room, set()).add(client)
+            else:
+                client.rooms.discard(room)
+                self.rooms.get(room, set()).discard(client)
+        else:
+            return f"unknown op {op!r}"
+        return None
+
+    def publish(self, node):
+        room = node["room"]
+        self.stats["received"] += 1
+        count("chat_server.received")
+        self.pending.setdefault(room, []).append(node)
+        if not self.flush_scheduled:
+            # Everything that arrives in this loop iteration goes to the log in one batch
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+        data = encode({"op": "message", "node": node})
+        for client in list(self.rooms.get(room, ())):
+            if client.offer(data):
+                self.stats["delivered"] += 1
+            else:
+                # A client that can't keep up is cut off rather than holding the room back;
+                # it can reconnect and catch up from the log
+                self.stats["slow_consumers"] += 1
+                for joined in client.rooms:
+                    self.rooms.get(joined, set()).discard(client)
+                client.abort()
+
+    def flush(self):
+        self.flush_scheduled = False
+        pending, self.pending = self.pending, {}
+        for room, nodes in pending.items():
+            get_writer(self.log_path(room)).append_many(nodes)
+
+
+async def serve(address, owner=SERVER_ID, queue_size=QUEUE_SIZE):
+    server = ChatServer(owner, queue_size)
+    host, port = parse_address(address)
+    bound = await server.start(host, port)
+    print(f"listening on {bound}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # No signal handlers on Windows event loops; Ctrl+C still raises KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        print(json.dumps(server.stats), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relay memory nodes between chat clients and log them per room")
+    parser.add_argument("--address", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}",
+                        help="host:port to listen on (port 0 picks one), or a Unix socket path")
+    parser.add_argument("--log-path", default=log_store.LOG_PATH)
+    parser.add_argument("--owner", default=SERVER_ID, help="room logs go under <log-path>/user_<owner>/")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    args = parser.parse_args()
+
+    log_store.LOG_PATH = args.log_path
+    try:
+        asyncio.run(serve(args.address, args.owner, args.queue_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
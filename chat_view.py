@@ -0,0 +1,201 @@
+import datetime
+import tkinter as tk
+from collections import deque
+from contextlib import nullcontext
+
+from log_store import read_page, read_page_after, complete_size, open_writer
+
+PAGE_SIZE = 200
+MAX_RENDERED = 1000
+TAIL_POLL_MS = 250
+
+
+def format_message(msg, nicknames):
+    timestamp = datetime.datetime.fromtimestamp(msg.get("timestamp", 0)).strftime("%H:%M:%S")
+    name = nicknames.get(msg.get("user_id"), msg.get("username", "User"))
+    return f"[{timestamp}] {name}: {msg.get('content', '')}\n\n"
+
+
+class PagedChatView:
+    # Shows a window of the room log in a Text widget: the newest page on open, older
+    # pages when scrolled to the top, newer ones when scrolled back down. Each page is
+    # one insert with one state toggle, and once more than max_rendered messages are
+    # shown the page furthest from the viewport is dropped, so the widget (and the
+    # cost of an insert) stays the same size however long the history is.
+    # Below the last page it shows what this process's LogWriter still has buffered for
+    # the log, so sends appear at once while the writer batches its flushes; the tail
+    # is polled and those lines are swapped for the real ones once they are written.
+    # Everything here runs on the Tk thread, so the log's end comes from complete_size
+    # rather than update_index, and a tail more than a page long is skipped, not drawn.
+    def __init__(self, text, nicknames, page_size=PAGE_SIZE, max_rendered=MAX_RENDERED):
+        self.text = text
+        self.nicknames = nicknames
+        self.page_size = page_size
+        self.max_rendered = max_rendered
+        self.path = None
+        # Rendered pages top to bottom: [start offset, end offset, messages, text lines]
+        self.pages = deque()
+        self.rendered = 0
+        self.loading = False
+        # Text lines of buffered messages shown after the last page, and the (log size,
+        # buffered count) they were drawn for
+        self.pending_lines = 0
+        self.pending_state = None
+        self.polling = None
+        self.text.config(yscrollcommand=self.on_scroll)
+
+    @property
+    def has_older(self):
+        return bool(self.pages) and self.pages[0][0] > 0
+
+    def open(self, path):
+        self.path = path
+        self._show_newest(complete_size(path))
+        self.refresh_tail()
+        self.text.see(tk.END)
+        if self.polling is None:
+            self.polling = self.text.after(TAIL_POLL_MS, self._poll)
+
+    def _show_newest(self, size):
+        self.pages.clear()
+        self.rendered = 0
+        self.pending_lines = 0
+        self.pending_state = None
+        self._replace("1.0", tk.END, "")
+        start, end, page = read_page(self.path, before=size, limit=self.page_size)
+        self.pages.append([start, end, 0, 0])
+        self._add_page(page, at_top=False)
+
+    def close(self):
+        if self.polling is not None:
+            self.text.after_cancel(self.polling)
+            self.polling = None
+
+    def _poll(self):
+        try:
+            self.refresh_tail()
+        finally:
+            self.polling = self.text.after(TAIL_POLL_MS, self._poll)
+
+    def _replace(self, first, last, content, at=None):
+        self.text.config(state='normal')
+        if first is not None:
+            self.text.delete(first, last)
+        if content:
+            self.text.insert(at or tk.END, content)
+        self.text.config(state='disabled')
+
+    def _add_page(self, page, at_top):
+        content = "".join(format_message(msg, self.nicknames) for offset, msg in page)
+        lines = content.count("\n")
+        record = self.pages[0] if at_top else self.pages[-1]
+        record[2] += len(page)
+        record[3] += lines
+        self.rendered += len(page)
+        if at_top:
+            top_line = int(self.text.index("@0,0").split(".")[0])
+            self._replace(None, None, content, at="1.0")
+            # Keep whatever was on screen where it was
+            self.text.yview(f"{top_line + lines}.0")
+        else:
+            self._replace(None, None, content)
+
+    def _trim(self, from_top):
+        while self.rendered > self.max_rendered and len(self.pages) > 1:
+            start, end, count, lines = self.pages.popleft() if from_top else self.pages.pop()
+            self.rendered -= count
+            if from_top:
+                top_line = int(self.text.index("@0,0").split(".")[0])
+                self._replace("1.0", f"{lines + 1}.0", "")
+                self.text.yview(f"{max(1, top_line - lines)}.0")
+            else:
+                # "end - 1 chars" sits after the last message's blank line, before Tk's own newline
+                last_line = int(self.text.index("end - 1 chars").split(".")[0])
+                self._replace(f"{last_line - lines}.0", "end - 1 chars", "")
+
+    def _drop_pending(self):
+        # Every page operation starts from the log's own lines; refresh_tail redraws these
+        if self.pending_lines:
+            last_line = int(self.text.index("end - 1 chars").split(".")[0])
+            self._replace(f"{last_line - self.pending_lines}.0", "end - 1 chars", "")
+            self.pending_lines = 0
+        self.pending_state = None
+
+    def _show_pending(self, nodes):
+        content = "".join(format_message(msg, self.nicknames) for msg in nodes)
+        self._replace(None, None, content)
+        self.pending_lines = content.count("\n")
+
+    def load_older(self):
+        if not self.has_older:
+            return
+        self._drop_pending()
+        start, end, page = read_page(self.path, before=self.pages[0][0], limit=self.page_size)
+        self.pages.appendleft([start, end, 0, 0])
+        self._add_page(page, at_top=True)
+        self._trim(from_top=False)
+
+    def load_newer(self, size=None):
+        # Returns False once the view has caught up with `size` (default: the end of the log)
+        if not self.pages:
+            return False
+        self._drop_pending()
+        size = complete_size(self.path) if size is None else size
+        start, end, page = read_page_after(self.path, self.pages[-1][1], limit=self.page_size, size=size)
+        if not page:
+            return False
+        self.pages.append([start, end, 0, 0])
+        self._add_page(page, at_top=False)
+        self._trim(from_top=True)
+        return end < size
+
+    def at_bottom(self):
+        return self.text.yview()[1] >= 1.0
+
+    def refresh_tail(self):
+        # Picks up messages appended to the log (ours or anyone's) and this process's
+        # buffered ones when the view ends at the current tail; scrolled into older
+        # history it leaves them for load_newer
+        if self.path is None or not self.pages:
+            return
+        writer = open_writer(self.path)
+        # With the writer's lock held no flush can land between reading the file size and
+        # reading the buffer, so drawing up to that size plus those nodes shows a message
+        # once (and never not at all); the drawing itself happens after the lock is let go
+        with writer.lock if writer else nullcontext():
+            size = complete_size(self.path)
+            pending = writer.pending() if writer else []
+        if (size, len(pending)) == self.pending_state:
+            return
+        follow = self.at_bottom()
+        self._drop_pending()
+        # Only pull the tail in if the bottom page is the live end of the log
+        if self.pages[-1][1] < size and (follow or self.rendered < self.max_rendered):
+            if self.load_newer(size) and follow:
+                # More than a page behind (a bulk import, say): start again from the
+                # newest page instead of drawing everything in between
+                self._show_newest(size)
+        if self.pages[-1][1] >= size:
+            if pending:
+                self._show_pending(pending)
+            self.pending_state = (size, len(pending))
+        if follow:
+            self.text.see(tk.END)
+
+    def on_scroll(self, first, last):
+        if self.loading or self.path is None:
+            return
+        if float(first) <= 0.0 and self.has_older:
+            self._schedule(self.load_older)
+        elif float(last) >= 1.0 and self.pages and self.pages[-1][1] < complete_size(self.path):
+            self._schedule(self.load_newer)
+
+    def _schedule(self, action):
+        self.loading = True
+
+        def run():
+            try:
+                action()
+            finally:
+                self.loading = False
+        self.text.after_idle(run)
@@ -1 +1,335 @@
+import os
+import re
+import csv
+import json
+import time
+import datetime
+import argparse
+import zlib
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+from itertools import chain
 
+import numpy as np
+
+import log_store
+from log_store import room_log_path, iter_room_logs, iter_messages, iter_chunks, get_writer, flush_writer, update_index
+
+STOPWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.csv")
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# vocabulary: word per shared id; user_ids: user per row index;
+# rows/cols/counts: sparse (user, word) -> count; totals: words counted per user
+WordCounts = namedtuple("WordCounts", ["vocabulary", "user_ids", "rows", "cols", "counts", "totals"])
+FEATURE_CACHE_SIZE = 1 << 14
+# Nodes carry a small hashed bag-of-words vector, the same 32 dims the existing logs use
+NODE_EMBED_DIM = 32
+NODE_TAGS = ("chat",)
+IMPORT_BATCH_SIZE = 10000
+# Column / key names accepted from chat exports, first match wins
+IMPORT_FIELDS = {
+    "content": ("content", "text", "message", "body"),
+    "user_id": ("user_id", "user", "author_id", "sender_id"),
+    "username": ("username", "name", "author", "sender"),
+    "timestamp": ("timestamp", "time", "date", "ts"),
+}
+
+_stopwords = None
+
+
+# Chat text repeats a lot ("ok", "lol", pasted links), so the id and the tokens of
+# each distinct text are worked out once and kept in an LRU cache
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def content_id(content):
+    # Same key analysis_cache.message_key derives for nodes without an id
+    return "msg_" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def content_features(content):
+    # (embedding, signal_score) for a text: the embedding is signed hashed counts of the
+    # stopword-filtered tokens, L2-normalized; the signal score is the share of words
+    # that survive the stopword filter
+    words = TOKEN_PATTERN.findall(content.lower())
+    tokens = tokenize(content)
+    vector = np.zeros(NODE_EMBED_DIM)
+    for token in tokens:
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % NODE_EMBED_DIM] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    signal = len(tokens) / len(words) if words else 0.0
+    return tuple(np.round(vector, 4).tolist()), round(signal, 3)
+
+
+def _memory_node(user_id, username, room, timestamp, content):
+    embedding, signal_score = content_features(content)
+    return {
+        "id": content_id(content),
+        "user_id": user_id,
+        "username": username,
+        "room": room,
+        "timestamp": timestamp,
+        "content": content,
+        "embedding": list(embedding),
+        "tags": list(NODE_TAGS),
+        "signal_score": signal_score,
+    }
+
+
+def generate_memory_node(user_id, username, room, content):
+    return _memory_node(user_id, username, room, int(time.time()), content)
+
+
+def generate_memory_nodes(messages, room="room_1"):
+    # Batch form of generate_memory_node for dicts with content and user_id, and
+    # optionally username and timestamp (missing timestamps get the current time)
+    now = int(time.time())
+    nodes = []
+    for msg in messages:
+        nodes.append(_memory_node(msg["user_id"], msg.get("username") or "User", room,
+                                  msg.get("timestamp") or now, msg["content"]))
+    return nodes
+
+
+def load_stopwords():
+    global _stopwords
+    if _stopwords is None:
+        with open(STOPWORDS_FILE, "r", encoding="utf-8") as f:
+            _stopwords = frozenset(line.strip().lower() for line in f if line.strip())
+    return _stopwords
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def tokenize(text):
+    # A tuple, since the cached result is shared between callers
+    stopwords = load_stopwords()
+    return tuple(t for t in TOKEN_PATTERN.findall(text.lower()) if t not in stopwords)
+
+
+def count_words(messages, chunk_size=5000):
+    vocabulary = {}
+    user_lookup = {}
+    key_parts = []
+    count_parts = []
+
+    # (user, word) pairs are packed into one int64 key so each chunk reduces with a single np.unique
+    for chunk in iter_chunks(messages, chunk_size):
+        keys = []
+        for msg in chunk:
+            uid = msg.get("user_id")
+            if not uid:
+                continue
+            row = user_lookup.setdefault(uid, len(user_lookup)) << 32
+            for token in tokenize(msg.get("content", "")):
+                keys.append(row | vocabulary.setdefault(token, len(vocabulary)))
+        if keys:
+            unique, counts = np.unique(np.array(keys, dtype=np.int64), return_counts=True)
+            key_parts.append(unique)
+            count_parts.append(counts)
+
+    if key_parts:
+        keys, inverse = np.unique(np.concatenate(key_parts), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(count_parts)).astype(np.int64)
+    else:
+        keys = np.zeros(0, dtype=np.int64)
+        counts = np.zeros(0, dtype=np.int64)
+
+    rows = keys >> 32
+    cols = keys & 0xFFFFFFFF
+    totals = np.bincount(rows, weights=counts, minlength=len(user_lookup)).astype(np.int64)
+    return WordCounts(list(vocabulary), list(user_lookup), rows, cols, counts, totals)
+
+
+def word_profiles(word_counts):
+    # Group by user, most frequent word first, then slice each user's run out once
+    order = np.lexsort((-word_counts.counts, word_counts.rows))
+    rows = word_counts.rows[order]
+    cols = word_counts.cols[order]
+    counts = word_counts.counts[order]
+    bounds = np.searchsorted(rows, np.arange(len(word_counts.user_ids) + 1))
+
+    profiles = {}
+    for row, uid in enumerate(word_counts.user_ids):
+        start, end = bounds[row], bounds[row + 1]
+        total = word_counts.totals[row]
+        freqs = counts[start:end] / total if total else counts[start:end]
+        profiles[uid] = {
+            "user_id": uid,
+            "total_words": int(total),
+            "word_freq": dict(zip((word_counts.vocabulary[c] for c in cols[start:end]), freqs.tolist())),
+        }
+    return profiles
+
+
+def build_user_word_profile(user_id, room="room_1"):
+    word_counts = count_words(iter_messages(room_log_path(user_id, room), user_id=user_id))
+    profile = word_profiles(word_counts).get(user_id)
+    if profile:
+        profile["room"] = room
+    return profile
+
+
+def build_room_word_counts(room="room_1"):
+    return count_words(chain.from_iterable(iter_messages(path) for folder, path in iter_room_logs(room)))
+
+
+def export_room_word_profiles(room="room_1", filename=None):
+    word_counts = build_room_word_counts(room)
+    if not len(word_counts.counts):
+        return None
+
+    filename = filename or f"{room}_word_profiles.csv"
+    order = np.lexsort((-word_counts.counts, word_counts.rows))
+    with open(filename, "w", newline='', encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["user_id", "word_id", "word", "count", "relative_frequency"])
+        for i in order:
+            row, col, count = word_counts.rows[i], word_counts.cols[i], word_counts.counts[i]
+            writer.writerow([word_counts.user_ids[row], col, word_counts.vocabulary[col], count,
+                             count / word_counts.totals[row]])
+    return filename
+
+
+def parse_timestamp(value):
+    # Epoch seconds (or milliseconds) as a number or string, or an ISO 8601 date
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        value = str(value).strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                return int(datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+            except ValueError:
+                return None
+    return int(seconds / 1000 if seconds > 1e11 else seconds)
+
+
+@lru_cache(maxsize=256)
+def _export_columns(keys):
+    # Rows of one export nearly always share their keys, so the alias lookup runs once
+    return tuple((field, next((name for name in names if name in keys), None))
+                 for field, names in IMPORT_FIELDS.items())
+
+
+def normalize_export_row(row):
+    fields = {field: row.get(name) if name else None for field, name in _export_columns(tuple(row))}
+    if not isinstance(fields["content"], str) or not fields["content"]:
+        return None
+    if fields["user_id"] is None:
+        if fields["username"] is None:
+            return None
+        # Exports that only name the sender still get a stable id per name
+        fields["user_id"] = hashlib.sha256(str(fields["username"]).encode("utf-8")).hexdigest()
+    fields["user_id"] = str(fields["user_id"])
+    fields["timestamp"] = parse_timestamp(fields["timestamp"])
+    return fields
+
+
+def iter_export_rows(filename, fmt=None):
+    # Yields the raw rows of a JSONL or CSV chat export; None for lines that don't parse
+    fmt = fmt or ("csv" if filename.lower().endswith(".csv") else "jsonl")
+    with open(filename, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield row if isinstance(row, dict) else None
+
+
+def row_digest(row):
+    return hashlib.sha256(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def import_chat_export(filename, owner_id, room="room_1", fmt=None, analyze=True, workers=None,
+                       batch_size=IMPORT_BATCH_SIZE, progress=None):
+    # Appends an external chat export to user_<owner_id>/<room>_log.jsonl. Each imported
+    # node records its source_row, and rows already imported are skipped, so re-importing
+    # a file is harmless; with analyze, every new distinct message is scored into the
+    # analysis cache right away instead of on the first chart
+    path = room_log_path(owner_id, room)
+    stats = {"path": path, "read": 0, "imported": 0, "duplicates": 0, "skipped": 0}
+    if progress:
+        progress(0.0, "Reading existing log")
+    seen = set()
+    if os.path.exists(path):
+        flush_writer(path)
+        seen = {m["source_row"] for m in iter_messages(path) if "source_row" in m}
+
+    occurrences = {}
+    # The app's own writer for the log, so its buffered sends and the import interleave
+    # instead of two file handles appending over each other
+    writer = get_writer(path)
+    try:
+        for chunk in iter_chunks(iter_export_rows(filename, fmt), batch_size):
+            stats["read"] += len(chunk)
+            rows = []
+            keys = []
+            for row in chunk:
+                fields = normalize_export_row(row) if row is not None else None
+                if fields is None:
+                    stats["skipped"] += 1
+                    continue
+                # A row is its content plus how many identical rows came before it, so
+                # re-importing (or importing a longer export of the same chat) skips what
+                # is already in the log while repeated rows of one export are all kept
+                digest = row_digest(row)
+                n = occurrences.get(digest, 0)
+                occurrences[digest] = n + 1
+                key = f"{digest}:{n}"
+                if key in seen:
+                    stats["duplicates"] += 1
+                    continue
+                rows.append(fields)
+                keys.append(key)
+            nodes = generate_memory_nodes(rows, room)
+            for node, key in zip(nodes, keys):
+                node["source_row"] = key
+            writer.append_many(nodes)
+            stats["imported"] += len(nodes)
+            if progress:
+                progress(0.0, f"Imported {stats['imported']} messages")
+    finally:
+        flush_writer(path)
+    update_index(path)
+
+    if analyze and stats["imported"]:
+        if progress:
+            progress(0.5, "Analyzing messages")
+        from bias_analyzer import prefetch_log_analyses
+        prefetch_log_analyses([path], workers)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import a JSONL or CSV chat export into memory_logs")
+    parser.add_argument("filename")
+    parser.add_argument("--owner", required=True, help="the log goes to <log-path>/user_<owner>/<room>_log.jsonl")
+    parser.add_argument("--room", default="room_1")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="default: from the file extension")
+    parser.add_argument("--log-path", default=log_store.LOG_PATH)
+    parser.add_argument("--no-analyze", action="store_true", help="leave bias analysis for later")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    log_store.LOG_PATH = args.log_path
+    start = time.perf_counter()
+    stats = import_chat_export(args.filename, args.owner, args.room, args.format, not args.no_analyze, args.workers)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class EmpathScorer:
+    # Empath.analyze rebuilds its token -> categories map on every call and walks a
+    # dict per token. This builds the map once as CSR arrays (token id -> category
+    # indices, duplicates kept so a term listed twice still counts twice) and scores
+    # a whole batch with a single bincount scatter-add.
+    def __init__(self, cats):
+        self.categories = list(cats.keys())
+        self.token_ids = {}
+        pairs = []
+        for j, cat in enumerate(self.categories):
+            for term in cats[cat]:
+                pairs.append((self.token_ids.setdefault(term, len(self.token_ids)), j))
+        pairs.sort()
+        tokens = np.array([t for t, j in pairs], dtype=np.int64)
+        self.term_categories = np.array([j for t, j in pairs], dtype=np.int64)
+        self.indptr = np.searchsorted(tokens, np.arange(len(self.token_ids) + 1))
+
+    def score(self, texts):
+        # Returns (counts, normalized, tokens): float64 [n x categories] raw counts, the
+        # same divided by each text's token count (NaN rows for empty texts, where
+        # analyze(normalize=True) gives None) and the token counts themselves
+        get = self.token_ids.get
+        n = len(texts)
+        n_categories = len(self.categories)
+        token_counts = np.zeros(n, dtype=np.int64)
+        hit_docs = []
+        hit_tokens = []
+        for i, text in enumerate(texts):
+            # Same tokenizer as empath's default: whitespace split, case kept
+            words = text.split()
+            token_counts[i] = len(words)
+            ids = [t for t in map(get, words) if t is not None]
+            if ids:
+                hit_tokens.extend(ids)
+                hit_docs.extend([i] * len(ids))
+
+        hit_tokens = np.array(hit_tokens, dtype=np.int64)
+        hit_docs = np.array(hit_docs, dtype=np.int64)
+        starts = self.indptr[hit_tokens]
+        lengths = self.indptr[hit_tokens + 1] - starts
+        # Expand every token hit into one entry per category it belongs to
+        expand = np.repeat(np.arange(len(hit_tokens)), lengths)
+        within = np.arange(len(expand)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        cats = self.term_categories[starts[expand] + within]
+        flat = hit_docs[expand] * n_categories + cats
+        counts = np.bincount(flat, minlength=n * n_categories).astype(np.float64).reshape(n, n_categories)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            normalized = counts / token_counts[:, None]
+        normalized[token_counts == 0] = np.nan
+        return counts, normalized, token_counts
+
+    def analyze(self, text, normalize=False):
+        # Drop-in for Empath.analyze(text, normalize=...) with the default tokenizer
+        counts, normalized, tokens = self.score([text])
+        if normalize:
+            if not tokens[0]:
+                return None
+            return dict(zip(self.categories, normalized[0].tolist()))
+        return dict(zip(self.categories, counts[0].tolist()))
+
+    def sparse(self, matrix):
+        # Non-zero entries of each row as {category: value}
+        rows, cols = np.nonzero(matrix)
+        values = matrix[rows, cols].tolist()
+        bounds = np.searchsorted(rows, np.arange(len(matrix) + 1)).tolist()
+        categories = self.categories
+        cols = cols.tolist()
+        return [{categories[c]: v for c, v in zip(cols[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]])}
+                for i in range(len(matrix))]
@@ -0,0 +1,280 @@
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+
+METRICS_FILE = "metrics.jsonl"
+SAMPLE_LIMIT = 5000
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+HISTOGRAM_BOUNDS_MS = [0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000, 10000]
+CAPTURE_MODES = ("cprofile", "tracemalloc")
+
+_enabled = False
+_stats = {}
+_counters = {}
+_lock = threading.Lock()
+_null_span = nullcontext()
+_dump_registered = False
+
+# Active capture: {"mode", "started", "profiles": [cProfile.Profile], "skipped"}; cProfile
+# only sees the thread that enabled it, so each outermost timed call gets its own
+# profiler and the results are merged when the capture stops. Only one runs at a time:
+# from Python 3.12 cProfile is built on the process-wide sys.monitoring and a second
+# profiler refuses to start, so calls made meanwhile on other threads run unprofiled
+# and are counted in "skipped"
+_capture = None
+_local = threading.local()
+_profile_lock = threading.Lock()
+
+
+class _Stat:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_LIMIT)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(dump_path=None):
+    global _enabled, _dump_registered
+    _enabled = True
+    if dump_path and not _dump_registered:
+        atexit.register(dump, dump_path)
+        _dump_registered = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+
+
+def record(name, seconds):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = _Stat()
+        stat.add(seconds)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    # with span("empath.score"): ...  -- a shared no-op context while disabled
+    if not _enabled:
+        return _null_span
+    return _Span(name)
+
+
+def timed(name=None):
+    # @timed() or @timed("custom.name"); while disabled the wrapper is one global check
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                if _capture is not None and _capture["mode"] == "cprofile":
+                    return _profiled_call(func, args, kwargs)
+                return func(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def _skip_profile():
+    with _lock:
+        if _capture is not None:
+            _capture["skipped"] += 1
+
+
+def _profiled_call(func, args, kwargs):
+    if getattr(_local, "profiling", False):
+        return func(*args, **kwargs)
+    # Set for skipped calls too, so the timed calls nested in them aren't counted again
+    _local.profiling = True
+    locked = _profile_lock.acquire(blocking=False)
+    try:
+        profile = cProfile.Profile() if locked else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # Some other tool (a debugger, coverage) holds the profiling hook
+                profile = None
+        if profile is None:
+            _skip_profile()
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with _lock:
+                if _capture is not None:
+                    _capture["profiles"].append(profile)
+    finally:
+        _local.profiling = False
+        if locked:
+            _profile_lock.release()
+
+
+def start_capture(mode="cprofile"):
+    global _capture
+    if mode not in CAPTURE_MODES:
+        raise ValueError(f"unknown capture mode {mode!r}")
+    stop_capture()
+    if mode == "tracemalloc":
+        tracemalloc.start(25)
+    _capture = {"mode": mode, "started": time.time(), "profiles": [], "skipped": 0}
+
+
+def capturing():
+    return _capture["mode"] if _capture else None
+
+
+def stop_capture(top=30, path=None):
+    # Returns a text report; with path, cProfile stats are also saved for pstats/snakeviz
+    global _capture
+    capture, _capture = _capture, None
+    if capture is None:
+        return None
+
+    out = io.StringIO()
+    if capture["mode"] == "cprofile":
+        if not capture["profiles"]:
+            return "No instrumented calls ran while profiling."
+        if capture["skipped"]:
+            out.write(f"{capture['skipped']} instrumented calls ran unprofiled while another was profiled\n\n")
+        stats = pstats.Stats(*capture["profiles"], stream=out)
+        if path:
+            stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(top)
+    else:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out.write(f"traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            out.write(f"{stat}\n")
+    return out.getvalue()
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+
+    def pick(q):
+        return ordered[min(last, int(round(q * last)))]
+    return pick(0.5), pick(0.9), pick(0.99)
+
+
+def histogram(samples):
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for seconds in samples:
+        ms = seconds * 1000
+        i = 0
+        while i < len(HISTOGRAM_BOUNDS_MS) and ms > HISTOGRAM_BOUNDS_MS[i]:
+            i += 1
+        counts[i] += 1
+    return counts
+
+
+def summary():
+    # name -> count, total and percentile timings in ms (percentiles over the last
+    # SAMPLE_LIMIT calls), plus a bucketed histogram; counters come back as plain ints
+    with _lock:
+        stats = {name: (s.count, s.total, s.max, list(s.samples)) for name, s in _stats.items()}
+        counters = dict(_counters)
+
+    result = {}
+    for name, (n, total, longest, samples) in sorted(stats.items()):
+        p50, p90, p99 = _percentiles(samples)
+        result[name] = {
+            "count": n,
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / n, 3),
+            "p50_ms": round(p50 * 1000, 3),
+            "p90_ms": round(p90 * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+            "max_ms": round(longest * 1000, 3),
+            "histogram": histogram(samples),
+        }
+    return result, counters
+
+
+def format_summary(limit=None):
+    spans, counters = summary()
+    rows = sorted(spans.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:limit]
+    lines = [f"{'span':<44}{'n':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'total':>10}"]
+    for name, s in rows:
+        lines.append(f"{name[-44:]:<44}{s['count']:>7}{s['p50_ms']:>9.2f}{s['p90_ms']:>9.2f}"
+                     f"{s['p99_ms']:>9.2f}{s['max_ms']:>9.1f}{s['total_ms']:>10.1f}")
+    if counters:
+        lines.append("")
+        lines.extend(f"{name:<44}{value:>7}" for name, value in sorted(counters.items()))
+    return "\n".join(lines)
+
+
+def dump(path=METRICS_FILE):
+    # Appends one line per span (and one for the counters) to a JSONL file
+    spans, counters = summary()
+    if not spans and not counters:
+        return None
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    with open(path, "a", encoding="utf-8") as f:
+        for name, s in spans.items():
+            f.write(json.dumps({"ts": now, "pid": os.getpid(), "span": name, **s}) + "\n")
+        if counters:
+            f.write(json.dumps({"ts": now, "pid": os.getpid(), "counters": counters}) + "\n")
+    return path
@@ -0,0 +1,102 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name, events):
+        self.name = name
+        self.progress = 0.0
+        self.message = ""
+        self._events = events
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+    def report(self, fraction, message=""):
+        # Called from the worker; also the natural place to bail out of a cancelled job
+        self.check()
+        self.progress = max(0.0, min(1.0, fraction))
+        self.message = message
+        self._events.put(("progress", self, None))
+
+
+class JobExecutor:
+    def __init__(self, root, max_workers=2, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="diagnostics")
+        self.events = queue.Queue()
+        self.callbacks = {}
+        self.active = set()
+        self.on_change = None
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, name, func, *args, on_done=None, on_error=None, **kwargs):
+        # func runs on the pool as func(job, *args, **kwargs); on_done/on_error run on the Tk thread
+        job = Job(name, self.events)
+        self.callbacks[job] = (on_done, on_error)
+        self.active.add(job)
+        self.pool.submit(self._run, job, func, args, kwargs)
+        self._changed()
+        return job
+
+    def cancel_all(self):
+        for job in list(self.active):
+            job.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job, func, args, kwargs):
+        try:
+            job.check()
+            result = func(job, *args, **kwargs)
+        except JobCancelled:
+            self.events.put(("cancelled", job, None))
+        except Exception as e:
+            self.events.put(("error", job, e))
+        else:
+            self.events.put(("done", job, result))
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def _poll(self):
+        try:
+            self._drain()
+        finally:
+            self.root.after(self.poll_ms, self._poll)
+
+    def _drain(self):
+        try:
+            while True:
+                kind, job, payload = self.events.get_nowait()
+                if kind != "progress":
+                    self.active.discard(job)
+                    on_done, on_error = self.callbacks.pop(job, (None, None))
+                    if kind == "done" and on_done:
+                        on_done(payload)
+                    elif kind == "error":
+                        if on_error:
+                            on_error(payload)
+                        else:
+                            print(f"{job.name} failed: {payload}")
+                self._changed()
+        except queue.Empty:
+            pass
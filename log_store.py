@@ -0,0 +1,832 @@
+import json
+import os
+import hashlib
+import heapq
+import threading
+import time
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from instrument import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOG_PATH = "memory_logs"
+INDEX_VERSION = 2
+# One (user code, line offset) record per indexed line in <room>_log.idx.off; the
+# codes' user ids are in <room>_log.idx.users, one JSON string per line
+OFFSET_RECORD = np.dtype([("user", "<i4"), ("offset", "<i8")])
+BLOCK_SIZE = 1 << 18
+CHUNK_SIZE = 1000
+LOG_SUFFIX = "_log.jsonl"
+CATALOGUE_FILE = "catalogue.json"
+CATALOGUE_VERSION = 2
+FLUSH_LINES = 256
+FLUSH_INTERVAL = 0.5
+
+# path -> (log mtime_ns, log size, index) so repeated reads skip re-parsing the sidecar
+_loaded_indexes = {}
+_index_lock = threading.RLock()
+
+# (catalogue file, its mtime_ns, contents); reloaded when another process rewrites it
+_catalogue = None
+
+
+def process_pool(workers):
+    # Spawned rather than forked: the app starts pools from job threads, and a forked
+    # worker keeps any lock another thread held at that moment (_index_lock...) locked
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def user_folder(user_id):
+    return os.path.join(LOG_PATH, f"user_{user_id}")
+
+
+def room_log_path(user_id, room):
+    return os.path.join(user_folder(user_id), f"{room}_log.jsonl")
+
+
+def index_path(path):
+    return path[:-len(".jsonl")] + ".idx.json" if path.endswith(".jsonl") else path + ".idx.json"
+
+
+def offsets_path(path):
+    return index_path(path)[:-len(".json")] + ".off"
+
+
+def index_users_path(path):
+    return index_path(path)[:-len(".json")] + ".users"
+
+
+def iter_room_logs(room="room_1"):
+    yield from room_logs(room)
+
+
+def room_name(path):
+    return os.path.basename(path)[:-len(LOG_SUFFIX)]
+
+
+def _new_index():
+    return {
+        "version": INDEX_VERSION,
+        "size": 0,
+        "head": None,
+        "sorted": True,
+        "last_ts": None,
+        # user_id -> line offsets and user_id -> code, in first-seen order; both live in
+        # the append-only sidecars, the JSON header only counts their entries
+        "users": {},
+        "codes": {},
+        "user_count": 0,
+        "users_bytes": 0,
+        "offsets": 0,
+        # [start_offset, end_offset, min_timestamp, max_timestamp, line_count]
+        "blocks": [],
+    }
+
+
+def _head_hash(path):
+    with open(path, "rb") as f:
+        first = f.readline()
+    if not first.endswith(b"\n"):
+        return None
+    return hashlib.sha256(first).hexdigest()[:16]
+
+
+def _read_index(path):
+    try:
+        with open(index_path(path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            return None
+        records = np.fromfile(offsets_path(path), dtype=OFFSET_RECORD, count=index["offsets"])
+        with open(index_users_path(path), "r", encoding="utf-8") as f:
+            names = [json.loads(line) for line in islice(f, index["user_count"])]
+    except (OSError, ValueError):
+        return None
+    # Entries past the header's counts are from an update that never finished; they
+    # get overwritten by the next one
+    if len(records) != index["offsets"] or len(names) != index["user_count"]:
+        return None
+    order = np.argsort(records["user"], kind="stable")
+    splits = np.cumsum(np.bincount(records["user"], minlength=len(names)))[:-1]
+    index["users"] = {uid: offsets.tolist() for uid, offsets in zip(names, np.split(records["offset"][order], splits))}
+    index["codes"] = {uid: i for i, uid in enumerate(names)}
+    return index
+
+
+def _append_sidecar(path, start, data):
+    # Cuts the file back to the `start` bytes the header vouches for, then appends
+    with open(path, "r+b" if start and os.path.exists(path) else "wb") as f:
+        f.truncate(start)
+        f.seek(0, os.SEEK_END)
+        f.write(data)
+        return f.tell()
+
+
+def _write_index(path, index, records, new_users):
+    # The sidecars are only ever appended to (a rebuilt index starts them over), so an
+    # update costs what it adds plus the JSON header, which holds no per-user data
+    _append_sidecar(offsets_path(path), index["offsets"] * OFFSET_RECORD.itemsize,
+                    np.array(records, dtype=OFFSET_RECORD).tobytes())
+    index["offsets"] += len(records)
+    names = "".join(json.dumps(uid) + "\n" for uid in new_users).encode("utf-8")
+    index["users_bytes"] = _append_sidecar(index_users_path(path), index["users_bytes"], names)
+    index["user_count"] += len(new_users)
+    header = {key: value for key, value in index.items() if key not in ("users", "codes")}
+    tmp = index_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(header, f, separators=(",", ":"))
+    os.replace(tmp, index_path(path))
+
+
+def _index_line(index, offset, line, records):
+    try:
+        msg = json.loads(line)
+    except json.JSONDecodeError:
+        return
+    if not isinstance(msg, dict):
+        return
+
+    uid = msg.get("user_id")
+    if uid:
+        code = index["codes"].get(uid)
+        if code is None:
+            code = index["codes"][uid] = len(index["codes"])
+            index["users"][uid] = []
+        index["users"][uid].append(offset)
+        records.append((code, offset))
+
+    blocks = index["blocks"]
+    if not blocks or blocks[-1][1] - blocks[-1][0] >= BLOCK_SIZE:
+        blocks.append([offset, offset, None, None, 0])
+    block = blocks[-1]
+    block[1] = offset + len(line)
+    block[4] += 1
+
+    ts = msg.get("timestamp")
+    if isinstance(ts, (int, float)):
+        block[2] = ts if block[2] is None else min(block[2], ts)
+        block[3] = ts if block[3] is None else max(block[3], ts)
+        if index["last_ts"] is not None and ts < index["last_ts"]:
+            index["sorted"] = False
+        index["last_ts"] = ts if index["last_ts"] is None else max(index["last_ts"], ts)
+
+
+@timed()
+def update_index(path):
+    # Covers what is in the file: lines still buffered by a LogWriter show up once it
+    # flushes (call flush_writer first to read this process's own appends back)
+    with _index_lock:
+        return _update_index(path)
+
+
+def _update_index(path):
+    if not os.path.exists(path):
+        return _new_index()
+
+    stat = os.stat(path)
+    size = stat.st_size
+    loaded = _loaded_indexes.get(path)
+    if loaded and loaded[0] == stat.st_mtime_ns and loaded[1] == size:
+        return loaded[2]
+
+    # A log that grew carries on from the index already in memory
+    index = loaded[2] if loaded else _read_index(path)
+    # A shrunk file or a different first line means the log was rewritten, not appended to
+    if index is None or size < index["size"] or (index["size"] and index["head"] != _head_hash(path)):
+        index = _new_index()
+    if size == index["size"]:
+        _loaded_indexes[path] = (stat.st_mtime_ns, size, index)
+        return index
+
+    offset = index["size"]
+    records = []
+    known = len(index["codes"])
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            _index_line(index, offset, line, records)
+            offset += len(line)
+
+    if offset != index["size"]:
+        if not index["size"]:
+            index["head"] = _head_hash(path)
+        index["size"] = offset
+        _write_index(path, index, records, list(index["codes"])[known:])
+    _loaded_indexes[path] = (stat.st_mtime_ns, size, index)
+    return index
+
+
+def load_index(path):
+    return update_index(path)
+
+
+def list_users(path):
+    return list(update_index(path)["users"])
+
+
+# The catalogue (<LOG_PATH>/catalogue.json) summarises every room log under LOG_PATH:
+# room, byte size, message count, first/last timestamp and per-user message counts.
+# Entries are derived from the log's index and brought up to date when the catalogue is
+# read, not on every append, so listing a room's users or logs costs O(logs + users)
+# instead of a pass over every message. The mtime of each folder is kept as well: a new
+# user folder or room log changes it, so finding new logs costs a stat per folder.
+
+def catalogue_path():
+    return os.path.join(LOG_PATH, CATALOGUE_FILE)
+
+
+def _catalogue_key(path):
+    if not path.endswith(LOG_SUFFIX):
+        return None
+    rel = os.path.relpath(path, LOG_PATH)
+    if rel.startswith(".."):
+        return None
+    return rel.replace(os.sep, "/")
+
+
+def _catalogue_entry(path, index):
+    blocks = index["blocks"]
+    firsts = [b[2] for b in blocks if b[2] is not None]
+    lasts = [b[3] for b in blocks if b[3] is not None]
+    return {
+        "room": room_name(path),
+        "size": index["size"],
+        "head": index["head"],
+        "messages": sum(b[4] for b in blocks),
+        "first_ts": min(firsts) if firsts else None,
+        "last_ts": max(lasts) if lasts else None,
+        "users": {uid: len(offsets) for uid, offsets in index["users"].items()},
+    }
+
+
+def _new_catalogue():
+    return {"version": CATALOGUE_VERSION, "logs": {}, "folders": {}}
+
+
+def _load_catalogue():
+    global _catalogue
+    path = catalogue_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if _catalogue and _catalogue[0] == path and _catalogue[1] == mtime:
+        return _catalogue[2]
+
+    data = None
+    if mtime is not None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = None
+    if data is None or data.get("version") != CATALOGUE_VERSION:
+        data = _new_catalogue() if mtime is None else None
+    _catalogue = (path, mtime, data)
+    return data
+
+
+def _save_catalogue(data):
+    global _catalogue
+    path = catalogue_path()
+    os.makedirs(LOG_PATH, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    _catalogue = (path, os.stat(path).st_mtime_ns, data)
+
+
+def _folder_key(folder):
+    return os.path.relpath(folder, LOG_PATH).replace(os.sep, "/")
+
+
+def _folder_mtime(folder):
+    try:
+        return os.stat(folder).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _changed_folders(data):
+    # {folder key: (folder, mtime)} for the folders whose listing may differ from what
+    # was catalogued: new ones under LOG_PATH and known ones whose mtime moved
+    known = data["folders"]
+    folders = {key: os.path.join(LOG_PATH, *key.split("/")) for key in known}
+    try:
+        with os.scandir(LOG_PATH) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    folders.setdefault(_folder_key(entry.path), entry.path)
+    except OSError:
+        pass
+    changed = {}
+    for key, folder in folders.items():
+        mtime = _folder_mtime(folder)
+        if mtime != known.get(key):
+            changed[key] = (folder, mtime)
+    return changed
+
+
+def _folder_logs(folder):
+    return sorted(name for name in os.listdir(folder) if name.endswith(LOG_SUFFIX))
+
+
+def _scan_folder(folder):
+    # (folder mtime, {path: entry}); runs in a pool worker during rebuild_catalogue, and
+    # for changed folders in catalogue_logs. Indexing writes sidecars, which moves the
+    # mtime, so it is read afterwards and the logs are listed again to catch a new one
+    names = _folder_logs(folder)
+    while True:
+        entries = {}
+        for name in names:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                entries[path] = _catalogue_entry(path, update_index(path))
+        mtime = _folder_mtime(folder)
+        listed = _folder_logs(folder)
+        if listed == names:
+            return mtime, entries
+        names = listed
+
+
+@timed()
+def rebuild_catalogue(workers=None):
+    # Walks LOG_PATH and (re)indexes every room log, one user folder per task. Can take a
+    # while on a big tree: call it from a job, not the Tk thread
+    folders = [root for root, dirs, files in os.walk(LOG_PATH) if any(f.endswith(LOG_SUFFIX) for f in files)]
+    workers = min(workers or os.cpu_count() or 1, len(folders))
+    if workers > 1:
+        with process_pool(workers) as pool:
+            results = list(pool.map(_scan_folder, folders))
+    else:
+        results = [_scan_folder(folder) for folder in folders]
+
+    data = _new_catalogue()
+    for folder, (mtime, entries) in zip(folders, results):
+        data["folders"][_folder_key(folder)] = mtime
+        for path, entry in entries.items():
+            data["logs"][_catalogue_key(path)] = entry
+    if os.path.isdir(LOG_PATH):
+        with _index_lock:
+            _save_catalogue(data)
+    return data
+
+
+def catalogue_logs(room=None):
+    # [(path, entry)] for the catalogued logs (of one room, if given). Logs in new or
+    # changed folders are added, logs that grew are re-indexed and ones that disappeared
+    # are dropped; the catalogue is then saved once. Only loading and saving hold
+    # _index_lock, so a slow pass doesn't block appends and index reads meanwhile
+    with _index_lock:
+        data = _load_catalogue()
+    if data is None or not os.path.exists(catalogue_path()):
+        data = rebuild_catalogue()
+
+    updates = {}
+    folders = {}
+    for key, (folder, mtime) in _changed_folders(data).items():
+        folders[key] = mtime
+        if mtime is not None:
+            folders[key], entries = _scan_folder(folder)
+            for path, entry in entries.items():
+                updates[_catalogue_key(path)] = entry
+
+    result = []
+    for key, entry in list(data["logs"].items()) + list(updates.items()):
+        if key in updates and updates[key] is not entry:
+            continue
+        path = os.path.join(LOG_PATH, *key.split("/"))
+        flush_writer(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            updates[key] = None
+            continue
+        if size != entry["size"]:
+            entry = updates[key] = _catalogue_entry(path, update_index(path))
+        if room is None or entry["room"] == room:
+            result.append((path, entry))
+
+    if updates or folders:
+        with _index_lock:
+            # Another process may have saved in between; merge into what is on disk now
+            fresh = _load_catalogue() or data
+            for key, mtime in folders.items():
+                if mtime is None:
+                    fresh["folders"].pop(key, None)
+                else:
+                    fresh["folders"][key] = mtime
+            for key, entry in updates.items():
+                if entry is None:
+                    fresh["logs"].pop(key, None)
+                else:
+                    fresh["logs"][key] = entry
+            _save_catalogue(fresh)
+    return result
+
+
+def room_logs(room="room_1"):
+    return [(os.path.dirname(path), path) for path, entry in catalogue_logs(room)]
+
+
+def room_summary(room="room_1"):
+    users = {}
+    summary = {"room": room, "logs": 0, "size": 0, "messages": 0, "first_ts": None, "last_ts": None}
+    for path, entry in catalogue_logs(room):
+        summary["logs"] += 1
+        summary["size"] += entry["size"]
+        summary["messages"] += entry["messages"]
+        if entry["first_ts"] is not None and (summary["first_ts"] is None or entry["first_ts"] < summary["first_ts"]):
+            summary["first_ts"] = entry["first_ts"]
+        if entry["last_ts"] is not None and (summary["last_ts"] is None or entry["last_ts"] > summary["last_ts"]):
+            summary["last_ts"] = entry["last_ts"]
+        for uid, n in entry["users"].items():
+            users[uid] = users.get(uid, 0) + n
+    summary["users"] = users
+    return summary
+
+
+def list_rooms():
+    return sorted({entry["room"] for path, entry in catalogue_logs()})
+
+
+def room_users(room="room_1"):
+    return sorted(room_summary(room)["users"])
+
+
+def user_room_log(user_id, room="room_1"):
+    # The log of `room` holding most of this user's messages (a user can show up in
+    # their own folder, an owner's simulated log, a server log, ...), or None
+    best, most = None, 0
+    for path, entry in catalogue_logs(room):
+        n = entry["users"].get(user_id, 0)
+        if n > most:
+            best, most = path, n
+    return best
+
+
+def _json_decoder(fast_json):
+    if fast_json and orjson is not None:
+        return orjson.loads
+    return json.loads
+
+
+def _in_window(msg, start, end):
+    if start is None and end is None:
+        return True
+    ts = msg.get("timestamp")
+    if not isinstance(ts, (int, float)):
+        return False
+    return (start is None or ts >= start) and (end is None or ts <= end)
+
+
+def _block_in_window(block, start, end):
+    min_ts, max_ts = block[2], block[3]
+    if min_ts is None:
+        return start is None and end is None
+    return (start is None or max_ts >= start) and (end is None or min_ts <= end)
+
+
+def _iter_block(f, block, loads):
+    f.seek(block[0])
+    offset = block[0]
+    for line in f.read(block[1] - block[0]).splitlines(keepends=True):
+        try:
+            msg = loads(line)
+        except json.JSONDecodeError:
+            msg = None
+        if isinstance(msg, dict):
+            yield offset, msg
+        offset += len(line)
+
+
+def _iter_filtered(path, index, user_id, start, end, loads):
+    with open(path, "rb") as f:
+        if user_id is not None:
+            for offset in index["users"].get(user_id, []):
+                f.seek(offset)
+                try:
+                    msg = loads(f.readline())
+                except json.JSONDecodeError:
+                    continue
+                if _in_window(msg, start, end):
+                    yield msg
+            return
+
+        for block in index["blocks"]:
+            if not _block_in_window(block, start, end):
+                continue
+            for offset, msg in _iter_block(f, block, loads):
+                if _in_window(msg, start, end):
+                    yield msg
+
+
+def iter_chunks(messages, chunk_size=CHUNK_SIZE):
+    chunk = []
+    for msg in messages:
+        chunk.append(msg)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_messages(path, user_id=None, start=None, end=None, fast_json=True):
+    if not os.path.exists(path):
+        return
+    index = update_index(path)
+    yield from _iter_filtered(path, index, user_id, start, end, _json_decoder(fast_json))
+
+
+def iter_message_chunks(path, user_id=None, start=None, end=None, chunk_size=CHUNK_SIZE, fast_json=True):
+    return iter_chunks(iter_messages(path, user_id, start, end, fast_json), chunk_size)
+
+
+def iter_sorted_messages(path, user_id=None, start=None, end=None, fast_json=True):
+    if not os.path.exists(path):
+        return
+    index = update_index(path)
+    if index["sorted"] or user_id is not None:
+        messages = iter_messages(path, user_id, start, end, fast_json)
+        if index["sorted"]:
+            yield from messages
+        else:
+            # One user's lines are a small slice of the log, sorting those is cheap
+            yield from sorted(messages, key=lambda m: m["timestamp"])
+        return
+
+    # Out-of-order appends: merge blocks by timestamp, only opening a block once the
+    # merge has reached its earliest timestamp. Ties keep file order like a stable sort.
+    loads = _json_decoder(fast_json)
+    blocks = sorted((b for b in index["blocks"] if b[2] is not None and _block_in_window(b, start, end)),
+                    key=lambda b: b[2])
+    heap = []
+    i = 0
+    with open(path, "rb") as f:
+        while i < len(blocks) or heap:
+            while i < len(blocks) and (not heap or blocks[i][2] <= heap[0][0]):
+                for offset, msg in _iter_block(f, blocks[i], loads):
+                    ts = msg.get("timestamp")
+                    if isinstance(ts, (int, float)) and _in_window(msg, start, end):
+                        heapq.heappush(heap, (ts, offset, msg))
+                i += 1
+            if heap:
+                yield heapq.heappop(heap)[2]
+
+
+def iter_range(path, start, end, fast_json=True, with_offsets=False):
+    loads = _json_decoder(fast_json)
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        while offset < end:
+            line = f.readline()
+            if not line:
+                break
+            line_offset = offset
+            offset += len(line)
+            try:
+                msg = loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(msg, dict):
+                yield (line_offset, msg) if with_offsets else msg
+
+
+def iter_reverse(path, end=None, fast_json=True, block_size=BLOCK_SIZE):
+    # Newest-first (offset, message) pairs ending at byte `end`, reading the file
+    # backwards one block at a time; a trailing line without its newline is skipped
+    loads = _json_decoder(fast_json)
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        carry = b""
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            data = f.read(pos - start) + carry
+            pos = start
+            # Up to the first newline belongs to a line that began in an earlier block
+            cut = data.find(b"\n") + 1 if start else 0
+            if start and not cut:
+                carry = data
+                continue
+            carry = data[:cut]
+            lines = data[cut:].splitlines(keepends=True)
+            offsets = []
+            offset = start + cut
+            for line in lines:
+                offsets.append(offset)
+                offset += len(line)
+            for offset, line in zip(reversed(offsets), reversed(lines)):
+                if not line.endswith(b"\n"):
+                    continue
+                try:
+                    msg = loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(msg, dict):
+                    yield offset, msg
+
+
+def read_page(path, before=None, limit=CHUNK_SIZE, fast_json=True):
+    # The `limit` messages just before byte offset `before` (default: the end of the
+    # log), oldest first, as (start, end, [(offset, message)]) so the caller can page
+    # further back from `start` or forward from `end`
+    if not os.path.exists(path):
+        return 0, 0, []
+    end = update_index(path)["size"] if before is None else before
+    page = list(islice(iter_reverse(path, end, fast_json), limit))
+    page.reverse()
+    return (page[0][0] if page else end), end, page
+
+
+def read_page_after(path, after, limit=CHUNK_SIZE, fast_json=True, size=None):
+    # Forward counterpart of read_page: up to `limit` messages starting at byte `after`
+    # and ending by `size` (default: the indexed end of the log)
+    if not os.path.exists(path):
+        return after, after, []
+    if size is None:
+        size = update_index(path)["size"]
+    page = list(islice(iter_range(path, after, size, fast_json, with_offsets=True), limit + 1))
+    end = page.pop()[0] if len(page) > limit else size
+    return after, end, page
+
+
+def complete_size(path, block_size=BLOCK_SIZE):
+    # Where the last complete line of the log ends, from a stat and a read at the tail:
+    # the same number update_index(path)["size"] gives, without indexing anything or
+    # waiting on _index_lock, for callers on the Tk thread
+    try:
+        with open(path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                start = max(0, pos - block_size)
+                f.seek(start)
+                newline = f.read(pos - start).rfind(b"\n")
+                if newline >= 0:
+                    return start + newline + 1
+                pos = start
+    except OSError:
+        pass
+    return 0
+
+
+def read_at(path, offsets, fast_json=True):
+    loads = _json_decoder(fast_json)
+    messages = []
+    with open(path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            try:
+                messages.append(loads(f.readline()))
+            except json.JSONDecodeError:
+                messages.append(None)
+    return messages
+
+
+def read_user_messages(path, user_id):
+    return list(iter_messages(path, user_id=user_id))
+
+
+def read_time_window(path, start=None, end=None):
+    return list(iter_messages(path, start=start, end=end))
+
+
+@timed()
+def read_messages(path):
+    return list(iter_messages(path))
+
+
+class LogWriter:
+    # Appends are buffered and written in batches (group commit): FLUSH_LINES at a time,
+    # or by the flusher thread once the oldest is FLUSH_INTERVAL old
+    def __init__(self, path, flush_lines=FLUSH_LINES, flush_interval=FLUSH_INTERVAL, fsync=False):
+        self.path = path
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.oldest = None
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.file = open(path, "ab")
+
+    def append(self, node):
+        self.append_many([node])
+
+    def append_many(self, nodes):
+        lines = [(json.dumps(node) + "\n").encode("utf-8") for node in nodes]
+        with self.lock:
+            self._check_open()
+            if not self.buffer:
+                self.oldest = time.monotonic()
+            self.buffer.extend(lines)
+            if len(self.buffer) >= self.flush_lines:
+                self._flush()
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.buffer and time.monotonic() - self.oldest >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def truncate(self):
+        with self.lock:
+            self._check_open()
+            self.buffer = []
+            self.file.truncate(0)
+
+    def pending(self):
+        # Nodes appended but not written yet. Read the file under self.lock as well to
+        # see the log and the buffer as of the same moment.
+        return [json.loads(line) for line in self.buffer]
+
+    def _check_open(self):
+        # Refuse rather than buffer lines no one would ever write (close_writers can
+        # run while a job still holds its writer); get_writer hands out a new one
+        if self.file.closed:
+            raise ValueError(f"LogWriter for {self.path} is closed")
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        self.file.write(b"".join(self.buffer))
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.buffer = []
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+_flusher = None
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL / 2)
+        for writer in list(_writers.values()):
+            writer.flush_if_due()
+
+
+def get_writer(path, fsync=False):
+    global _flusher
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = LogWriter(path, fsync=fsync)
+            _writers[path] = writer
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="log-flusher", daemon=True)
+            _flusher.start()
+    return writer
+
+
+def open_writer(path):
+    # This process's writer for path, if it has one
+    return _writers.get(path)
+
+
+def flush_writer(path):
+    writer = _writers.get(path)
+    if writer is not None:
+        writer.flush()
+
+
+def close_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_writers)
+
+
+def append_nodes(path, nodes):
+    get_writer(path).append_many(nodes)
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import log_store
+from bias_analyzer import prefetch_analyses, room_profile_frames, sentiment_to_color
+
+TOP_CATEGORIES = 10
+RENDER_BATCH = 64
+# zlib level for the PNGs: 1 is ~20% quicker than the default 6 at nearly the same size
+PNG_COMPRESS_LEVEL = 1
+SAFE_NAME = re.compile(r"[^A-Za-z0-9_-]")
+
+# One figure per worker process, redrawn for every user
+_template = None
+
+
+class RadarTemplate:
+    # The same picture draw_radar makes, but the figure, axes, line segments and fills
+    # are built once and only their data, colors and labels change per user
+    def __init__(self, n=TOP_CATEGORIES, figsize=(6, 6), dpi=100):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.n = n
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        # Fixed margins instead of tight_layout, which costs more than the drawing itself
+        self.fig.subplots_adjust(left=0.12, right=0.88, top=0.86, bottom=0.08)
+        self.ax = self.fig.add_subplot(projection="polar")
+        self.angles = np.linspace(0, 2 * np.pi, n, endpoint=False).tolist()
+        self.ax.set_xticks(self.angles)
+
+        self.lines = []
+        self.fills = []
+        angles = self.angles + self.angles[:1]
+        for i in range(n):
+            line, = self.ax.plot([angles[i], angles[i + 1]], [0, 0], linewidth=3)
+            self.lines.append(line)
+            self.fills.append(self.ax.fill_between([angles[i], angles[i + 1]], 0, [0, 0], alpha=0.3))
+        self.title = self.ax.set_title("")
+
+    def render(self, path, categories, values, colors, title):
+        angles = self.angles + self.angles[:1]
+        values = list(values) + list(values[:1])
+        for i in range(self.n):
+            x = [angles[i], angles[i + 1]]
+            y = [values[i], values[i + 1]]
+            self.lines[i].set_data(x, y)
+            self.lines[i].set_color(colors[i])
+            self.fills[i].set_verts([[(x[0], 0), (x[0], y[0]), (x[1], y[1]), (x[1], 0)]])
+            self.fills[i].set_facecolor(colors[i])
+            self.fills[i].set_edgecolor(colors[i])
+        self.ax.set_xticklabels(categories, fontsize=9)
+        self.title.set_text(title)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.fig.savefig(path, dpi=self.dpi, pil_kwargs={"compress_level": PNG_COMPRESS_LEVEL})
+
+
+def chart_data(profiles, directions, top=TOP_CATEGORIES):
+    # (user_id, categories, values, colors) per user, the same numbers radar_chart_data
+    # gives, taken from the room-wide frames in one go
+    categories = np.array(profiles.columns)
+    values = profiles.to_numpy()
+    # Stable, so ties (mostly zeros) keep the lexicon's category order
+    order = np.argsort(-values, axis=1, kind="stable")[:, :top]
+    sentiment = directions.reindex(index=profiles.index, columns=profiles.columns).to_numpy()
+    for row, uid in enumerate(profiles.index):
+        cols = order[row]
+        # detect_bias_direction rounds to 4 places and charts None as neutral
+        colors = [sentiment_to_color(0.0 if np.isnan(s) else round(s, 4)) for s in sentiment[row, cols]]
+        yield uid, categories[cols].tolist(), values[row, cols].tolist(), colors
+
+
+def chart_filename(user_id):
+    return SAFE_NAME.sub("_", user_id) + ".png"
+
+
+def render_batch(jobs, dpi):
+    # Runs in a pool worker; returns how many charts it wrote
+    global _template
+    if _template is None or _template.dpi != dpi:
+        _template = RadarTemplate(dpi=dpi)
+    for path, categories, values, colors, title in jobs:
+        if len(categories) == _template.n:
+            _template.render(path, categories, values, colors, title)
+        else:
+            # Fewer categories than the template has slots: draw this one from scratch
+            from matplotlib.figure import Figure
+            from bias_analyzer import draw_radar
+            fig = Figure(figsize=(6, 6))
+            draw_radar(fig, categories, values, colors, title)
+            fig.savefig(path, dpi=dpi, pil_kwargs={"compress_level": PNG_COMPRESS_LEVEL})
+    return len(jobs)
+
+
+def write_report(room="room_1", out_dir="reports", workers=None, dpi=100, charts=True, prefetch=True,
+                 batch_size=RENDER_BATCH, progress=print):
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    stats = {"room": room, "out_dir": out_dir}
+
+    if prefetch:
+        # Scores every message not in an analysis cache yet, spread over the pool
+        progress("analyzing uncached messages")
+        prefetch_analyses([room], workers)
+    profiles, directions = room_profile_frames(room)
+    stats["users"] = len(profiles)
+    stats["profiles_s"] = round(time.perf_counter() - start, 3)
+
+    csv_path = os.path.join(out_dir, f"{room}_bias_profiles.csv")
+    profiles.to_csv(csv_path, index_label="user_id")
+    stats["csv"] = csv_path
+
+    stats["charts"] = 0
+    if charts and len(profiles):
+        chart_dir = os.path.join(out_dir, "charts")
+        os.makedirs(chart_dir, exist_ok=True)
+        jobs = [(os.path.join(chart_dir, chart_filename(uid)), categories, values, colors,
+                 f"Top 10 Bias Traits (Color = Sentiment): {uid}")
+                for uid, categories, values, colors in chart_data(profiles, directions)]
+        batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+        render_start = time.perf_counter()
+        if workers == 1:
+            for batch in batches:
+                stats["charts"] += render_batch(batch, dpi)
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+                for n in pool.map(render_batch, batches, [dpi] * len(batches)):
+                    stats["charts"] += n
+                    progress(f"{stats['charts']}/{len(jobs)} charts")
+        render_s = time.perf_counter() - render_start
+        stats["render_s"] = round(render_s, 3)
+        stats["charts_per_s"] = round(stats["charts"] / render_s, 1) if render_s else None
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="write every user's bias radar chart and one combined bias CSV")
+    parser.add_argument("--room", default="room_1")
+    parser.add_argument("--out-dir", default="reports")
+    parser.add_argument("--log-path", default=log_store.LOG_PATH)
+    parser.add_argument("--workers", type=int, help="default: one per CPU")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--no-charts", action="store_true", help="only write the CSV")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="analyze uncached messages on the main process instead of the pool")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    log_store.LOG_PATH = args.log_path
+    progress = (lambda message: None) if args.quiet else (lambda message: print(message, flush=True))
+    stats = write_report(args.room, args.out_dir, args.workers, args.dpi, not args.no_charts,
+                         not args.no_prefetch, progress=progress)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,31 @@
 import tkinter as tk
-from tkinter import messagebox, ttk
+from tkinter import messagebox, ttk, filedialog
 
 
 import json
 import os
-import datetime
 import csv
 
-import matplotlib.pyplot as plt
-import numpy as np
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from bias_analyzer import build_radar_figure, build_average_bias_figure, warm_up
+from bias_trends import build_trend_figure
 
-from bias_analyzer import plot_radar_chart
-
-from embed_input import generate_memory_node, build_user_word_profile
-from bias_analyzer import analyze_user_bias
+from embed_input import generate_memory_node, build_user_word_profile, export_room_word_profiles, import_chat_export
+from bias_analyzer import analyze_user_bias, update_room_profiles
+from log_store import room_log_path, get_writer, flush_writer, close_writers, iter_sorted_messages, room_users, rebuild_catalogue
+from chat_view import PagedChatView
+from chat_client import ChatBridge
+from chat_server import DEFAULT_HOST, DEFAULT_PORT
+from jobs import JobExecutor
+import instrument
+from instrument import timed
+from semantic_recall import update_recall_index
 
 ACCOUNT_FILE = "account.json"
 WORD_LIST = [f"word{i}" for i in range(2048)]
+CHAT_ROOM = "room_1"
+# Sends only append; the logs they touched are folded into the bias profiles and recall
+# index by one background job at most this often
+LOG_UPDATE_DELAY_MS = 1000
 
 
 def save_account(mnemonic):
@@ -40,7 +48,14 @@ class ChatApp:
 
         self.fake_user_id = "bypass_local_mode"
         self.username = "Anonymous"
+        self.current_room = CHAT_ROOM
+        self.bridge = None
+        self.jobs = JobExecutor(root)
+        self.dirty_logs = set()
+        self.log_update = None
         self.open_chat_window()
+        # Analyzers and matplotlib load lazily; start on them once the window is idle
+        self.root.after_idle(self.start_warm_up)
 
 
     def paste_clipboard(self, event=None):
@@ -97,14 +112,9 @@ class ChatApp:
         self.chat_log.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 5))
 
         user_id = getattr(self, "fake_user_id", "bypass_local_mode")
-        messages = self.load_messages_for_room(user_id, "main")
-
-        for msg in messages:
-            timestamp = datetime.datetime.fromtimestamp(msg["timestamp"]).strftime("%H:%M:%S")
-            name = self.user_nicknames.get(msg["user_id"], msg.get("username", "User"))
-            self.chat_log.config(state='normal')
-            self.chat_log.insert(tk.END, f"[{timestamp}] {name}: {msg['content']}\n\n")
-            self.chat_log.config(state='disabled')
+        # Only the newest page is rendered up front; older ones load as the log is scrolled up
+        self.chat_view = PagedChatView(self.chat_log, self.user_nicknames)
+        self.chat_view.open(room_log_path(user_id, self.current_room))
 
         self.chat_entry = tk.Entry(self.center_frame)
         self.chat_entry.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -116,12 +126,29 @@ class ChatApp:
         self.right_frame = tk.Frame(main_pane, width=widths["right"], bg="#333")
         tk.Label(self.right_frame, text="Diagnostics", fg="white", bg="#333").pack(anchor="nw", padx=10, pady=5)
 
+        self.job_status = tk.Label(self.right_frame, text="Idle", fg="gray", bg="#333", wraplength=180, justify="left")
+        self.job_status.pack(anchor="nw", padx=10)
+        tk.Button(self.right_frame, text="Cancel Running", command=self.jobs.cancel_all).pack(padx=10, pady=5)
+        self.jobs.on_change = self.update_job_status
+
+        # Timing spans are off (and near free) until this is ticked
+        self.metrics_var = tk.BooleanVar(value=instrument.enabled())
+        tk.Checkbutton(self.right_frame, text="Record Metrics", variable=self.metrics_var,
+                       command=self.toggle_metrics, fg="white", bg="#333", selectcolor="#333").pack(padx=10, anchor="w")
+        tk.Button(self.right_frame, text="Show Metrics", command=self.show_metrics).pack(padx=10, pady=5)
+        self.capture_mode = ttk.Combobox(self.right_frame, state="readonly", values=instrument.CAPTURE_MODES)
+        self.capture_mode.set(instrument.CAPTURE_MODES[0])
+        self.capture_mode.pack(padx=10, fill="x")
+        self.profile_button = tk.Button(self.right_frame, text="Start Profiling", command=self.toggle_profiling)
+        self.profile_button.pack(padx=10, pady=5)
 
         tk.Button(self.right_frame, text="Generate Word CSV", command=self.export_user_word_profile).pack(padx=10, pady=10)
+        tk.Button(self.right_frame, text="Room Word CSV", command=self.export_room_word_profiles).pack(padx=10, pady=5)
         tk.Button(self.right_frame, text="Simulate Conversation", command=self.simulate_conversation).pack(padx=10, pady=10)
+        tk.Button(self.right_frame, text="Import Chat Export", command=self.import_chat_export).pack(padx=10, pady=5)
         tk.Button(self.right_frame, text="average Bias Radar Chart", command=self.average_bias_chart).pack(padx=10, pady=5)
         tk.Button(self.right_frame, text="Export Bias CSV", command=self.export_bias_csv).pack(padx=10, pady=5)
-        tk.Button(self.right_frame, text="Reload User List", command=self.populate_user_selector).pack(padx=10, pady=5)
+        tk.Button(self.right_frame, text="Reload User List", command=self.reload_user_list).pack(padx=10, pady=5)
 
         # Dropdown for user selection
         tk.Label(self.right_frame, text="Select User:", fg="white", bg="#333").pack(padx=10, pady=(10, 0), anchor="w")
@@ -129,13 +156,15 @@ class ChatApp:
         self.user_dropdown = ttk.Combobox(self.right_frame, state="readonly")
         self.user_dropdown.pack(padx=10, pady=(0, 5), fill="x")
 
-        # Populate it with users found in the simulated log
+        # Populate it with the simulated room's users, straight from the log catalogue
         self.populate_user_selector()
 
         tk.Button(self.right_frame, text="Show Radar Chart", command=self.show_selected_user_chart).pack(padx=10,
                                                                                                          pady=5)
+        tk.Button(self.right_frame, text="Show Trend Chart", command=self.show_selected_user_trend).pack(padx=10,
+                                                                                                         pady=5)
 
-        chat_window.bind("<Escape>", lambda e: chat_window.destroy())
+        chat_window.bind("<Escape>", lambda e: self.close_chat_window(chat_window))
 
         main_pane.add(self.left_frame)
         main_pane.add(self.center_frame)
@@ -144,27 +173,167 @@ class ChatApp:
         main_pane.paneconfig(self.center_frame, width=widths["center"])
         main_pane.paneconfig(self.right_frame, width=widths["right"])
 
+    def close_chat_window(self, chat_window):
+        # First, so sends that were never echoed are still stored while the writers are open
+        self.disconnect_server()
+        if self.log_update:
+            # Whatever was still pending is folded in by the next update of that log
+            self.root.after_cancel(self.log_update)
+            self.log_update = None
+        self.chat_view.close()
+        self.jobs.shutdown()
+        close_writers()
+        chat_window.destroy()
+
+    def update_job_status(self, executor):
+        if not executor.active:
+            self.job_status.config(text="Idle")
+            return
+        lines = [f"{job.name}: {int(job.progress * 100)}% {job.message}" for job in executor.active]
+        self.job_status.config(text="\n".join(lines))
+
+    def toggle_metrics(self):
+        if self.metrics_var.get():
+            instrument.enable()
+        else:
+            instrument.disable()
+
+    def show_text_window(self, title, text):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        box = tk.Text(window, width=100, height=30, font=("Courier", 9))
+        box.insert(tk.END, text)
+        box.config(state='disabled')
+        box.pack(fill=tk.BOTH, expand=True)
+        return window
+
+    def show_metrics(self):
+        window = self.show_text_window("Metrics", instrument.format_summary() or "No spans recorded yet.")
+
+        def dump():
+            path = instrument.dump()
+            if path:
+                messagebox.showinfo("Metrics Saved", f"Appended to {path}", parent=window)
+
+        def reset():
+            instrument.reset()
+            window.destroy()
+
+        tk.Button(window, text="Dump to JSONL", command=dump).pack(side=tk.LEFT, padx=10, pady=5)
+        tk.Button(window, text="Reset", command=reset).pack(side=tk.LEFT, padx=10, pady=5)
+
+    def toggle_profiling(self):
+        if instrument.capturing():
+            report = instrument.stop_capture()
+            self.profile_button.config(text="Start Profiling")
+            self.show_text_window("Profile", report)
+            return
+        # Capture hooks into the timed wrappers, so recording has to be on as well
+        self.metrics_var.set(True)
+        instrument.enable()
+        instrument.start_capture(self.capture_mode.get())
+        self.profile_button.config(text="Stop Profiling")
+
+    def show_job_error(self, error):
+        messagebox.showerror("Diagnostics Failed", str(error))
+
+    def start_warm_up(self):
+        self.jobs.submit("Loading analyzers", self.warm_up)
+
+    def warm_up(self, job):
+        warm_up()
+        import matplotlib.backends.backend_tkagg
+
+    @timed()
+    def show_figure(self, fig, title):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        canvas = FigureCanvasTkAgg(fig, master=window)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    @timed()
     def send_message(self):
         msg = self.chat_entry.get().strip()
         if msg:
             user_id = getattr(self, "fake_user_id", "bypass_local_mode")
-            node = generate_memory_node(user_id, self.username, "room_1", msg)
-
-            # Save to memory log
-            folder = os.path.join("memory_logs", f"user_{user_id}")
-            os.makedirs(folder, exist_ok=True)
-            path = os.path.join(folder, "room_1_log.jsonl")
-            with open(path, "a") as f:
-                f.write(json.dumps(node) + "\n")
-
-            # Display message in chat window
-            self.chat_log.config(state='normal')
-            timestamp = datetime.datetime.fromtimestamp(node["timestamp"]).strftime("%H:%M:%S")
-            name = self.user_nicknames.get(user_id, self.username)
-            self.chat_log.insert(tk.END, f"[{timestamp}] {name}: {msg}\n\n")
-            self.chat_log.config(state='disabled')
+            node = generate_memory_node(user_id, self.username, self.current_room, msg)
+            if self.bridge and self.bridge.connected:
+                # The server echoes it back to every client in the room, this one included,
+                # and receive_messages stores it then (keep_undelivered if it never does)
+                self.bridge.send(node)
+            else:
+                self.store_messages(self.current_room, [node])
             self.chat_entry.delete(0, tk.END)
 
+    def store_messages(self, room, nodes):
+        # Save to memory log; profiles and the recall index catch up in the background
+        user_id = getattr(self, "fake_user_id", "bypass_local_mode")
+        path = room_log_path(user_id, room)
+        get_writer(path).append_many(nodes)
+        self.schedule_log_update(path)
+
+        # The writer batches its flushes; the view shows buffered nodes until they land
+        if room == self.current_room:
+            self.chat_view.refresh_tail()
+
+    def schedule_log_update(self, path):
+        self.dirty_logs.add(path)
+        if self.log_update is None:
+            self.log_update = self.root.after(LOG_UPDATE_DELAY_MS, self.update_dirty_logs)
+
+    def update_dirty_logs(self):
+        self.log_update = None
+        paths, self.dirty_logs = self.dirty_logs, set()
+
+        def work(job):
+            # Both fold in only what was appended since their last update, so a burst of
+            # sends costs one pass (and the first call's model load stays off the Tk thread)
+            for path in paths:
+                job.check()
+                # One write for everything sent since the last update, not one per send
+                flush_writer(path)
+                update_room_profiles(path)
+                update_recall_index(path)
+
+        self.jobs.submit("Updating profiles", work)
+
+    def receive_messages(self, nodes):
+        by_room = {}
+        for node in nodes:
+            by_room.setdefault(node["room"], []).append(node)
+        for room, room_nodes in by_room.items():
+            self.store_messages(room, room_nodes)
+
+    def keep_undelivered(self, nodes):
+        # Sends the server never echoed are kept in the local log rather than dropped
+        self.receive_messages(nodes)
+
+    def switch_room(self, room):
+        if room == self.current_room:
+            return
+        if self.bridge and self.bridge.connected:
+            self.bridge.leave(self.current_room)
+            self.bridge.join(room)
+        self.current_room = room
+        user_id = getattr(self, "fake_user_id", "bypass_local_mode")
+        self.chat_view.open(room_log_path(user_id, room))
+
+    def connect_server(self, address):
+        self.disconnect_server()
+        self.bridge = ChatBridge(self.root, self.receive_messages, on_error=self.show_server_error,
+                                 on_undelivered=self.keep_undelivered)
+        self.bridge.connect(address, rooms=[self.current_room])
+
+    def disconnect_server(self):
+        if self.bridge:
+            self.bridge.close()
+            self.bridge = None
+
+    def show_server_error(self, error):
+        messagebox.showerror("Chat Server", str(error))
+
     def clear_left_content(self):
         for widget in self.left_content.winfo_children():
             widget.destroy()
@@ -179,6 +348,12 @@ class ChatApp:
         scrollbar = tk.Scrollbar(self.left_content, command=chat_listbox.yview)
         chat_listbox.config(yscrollcommand=scrollbar.set)
 
+        def select_room(event):
+            selection = chat_listbox.curselection()
+            if selection:
+                self.switch_room(f"room_{selection[0] + 1}")
+        chat_listbox.bind("<<ListboxSelect>>", select_room)
+
         chat_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0), pady=(0, 10))
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=(0, 10))
 
@@ -205,6 +380,18 @@ class ChatApp:
 
         tk.Button(self.left_content, text="Save Layout", command=self.save_layout).pack(padx=10, pady=10)
 
+        tk.Label(self.left_content, text="Chat server (host:port):", fg="white", bg="#1e1e1e").pack(anchor="w", padx=10)
+        server_entry = tk.Entry(self.left_content)
+        server_entry.insert(0, f"{DEFAULT_HOST}:{DEFAULT_PORT}")
+        server_entry.pack(padx=10, pady=5)
+
+        def connect():
+            address = server_entry.get().strip()
+            if address:
+                self.connect_server(address)
+        tk.Button(self.left_content, text="Connect", command=connect).pack(padx=10, pady=(0, 5))
+        tk.Button(self.left_content, text="Disconnect", command=self.disconnect_server).pack(padx=10, pady=(0, 10))
+
         tk.Label(self.left_content, text="(Other settings coming soon...)", fg="gray", bg="#1e1e1e").pack(padx=10,
                                                                                                           pady=10)
 
@@ -229,6 +416,7 @@ class ChatApp:
 
         tk.Button(self.left_content, text="Save Nickname", command=save_nick).pack(padx=10, pady=10)
 
+    @timed()
     def save_layout(self):
         layout_data = {
             "layout": {
@@ -245,6 +433,7 @@ class ChatApp:
             json.dump(layout_data, f, indent=2)
         messagebox.showinfo("Layout Saved", "Your layout and user data have been saved.")
 
+    @timed()
     def load_saved_layout(self):
         if not os.path.exists("layout.json"):
             return None
@@ -257,48 +446,61 @@ class ChatApp:
 
 
 
+    @timed()
     def write_to_memory_log(user_id, username, room, content):
         node = generate_memory_node(user_id, username, room, content)
-        folder = os.path.join("memory_logs", f"user_{user_id}")
-        os.makedirs(folder, exist_ok=True)
-        filepath = os.path.join(folder, f"{room}_log.jsonl")
-        with open(filepath, "a") as f:
-            f.write(json.dumps(node) + "\n")
+        path = room_log_path(user_id, room)
+        # Profiles and the recall index pick the node up on their next update
+        get_writer(path).append(node)
         return node
 
+    def iter_messages_for_room(self, user_id, room):
+        return iter_sorted_messages(room_log_path(user_id, room))
+
+    @timed()
     def load_messages_for_room(self, user_id, room):
-        folder = os.path.join("memory_logs", f"user_{user_id}")
-        path = os.path.join(folder, f"{room}_log.jsonl")
-        if not os.path.exists(path):
-            return []
-
-        messages = []
-        with open(path, "r") as f:
-            for line in f:
-                try:
-                    msg = json.loads(line.strip())
-                    messages.append(msg)
-                except:
-                    continue
-        messages.sort(key=lambda m: m["timestamp"])
-        return messages
+        return list(self.iter_messages_for_room(user_id, room))
 
     def export_user_word_profile(self):
         user_id = getattr(self, "fake_user_id", "bypass_local_mode")
-        profile = build_user_word_profile(user_id, "room_1")
+        filename = f"user_{user_id[:8]}_word_profile.csv"
 
-        if not profile or "word_freq" not in profile:
-            messagebox.showerror("No Data", "No messages or vocabulary data found to export.")
-            return
+        def work(job):
+            job.report(0.0, "Counting words")
+            profile = build_user_word_profile(user_id, "room_1")
+            if not profile or "word_freq" not in profile:
+                return None
 
-        filename = f"user_{user_id[:8]}_word_profile.csv"
-        with open(filename, "w", newline='', encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["word", "relative_frequency"])
-            for word, freq in profile["word_freq"].items():
-                writer.writerow([word, freq])
+            job.report(0.8, "Writing CSV")
+            with open(filename, "w", newline='', encoding="utf-8") as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(["word", "relative_frequency"])
+                for word, freq in profile["word_freq"].items():
+                    writer.writerow([word, freq])
+            return filename
+
+        def done(result):
+            if result is None:
+                messagebox.showerror("No Data", "No messages or vocabulary data found to export.")
+            else:
+                messagebox.showinfo("Export Complete", f"Saved to {filename}")
+
+        self.jobs.submit("Word CSV", work, on_done=done, on_error=self.show_job_error)
+
+    def export_room_word_profiles(self):
+        room = "simulated_room_1"
+
+        def work(job):
+            job.report(0.0, "Counting words")
+            return export_room_word_profiles(room)
 
-        messagebox.showinfo("Export Complete", f"Saved to {filename}")
+        def done(filename):
+            if filename is None:
+                messagebox.showerror("No Data", "No messages or vocabulary data found to export.")
+            else:
+                messagebox.showinfo("Export Complete", f"Saved to {filename}")
+
+        self.jobs.submit("Room Word CSV", work, on_done=done, on_error=self.show_job_error)
 
 
 
@@ -307,33 +509,75 @@ class ChatApp:
 
     def simulate_conversation(self):
         user_id = getattr(self, "fake_user_id", "bypass_local_mode")
-        messages = self.load_messages_for_room(user_id, "room_1")
 
-        if not messages:
-            messagebox.showerror("No Data", "No messages found to simulate.")
+        def work(job):
+            job.report(0.0, "Loading messages")
+            messages = self.load_messages_for_room(user_id, "room_1")
+            if not messages:
+                return None
+
+            # Define synthetic user IDs for simulation
+            user_ids = [
+                user_id + "_A",
+                user_id + "_B"
+            ]
+
+            # Apply alternating user IDs to simulate a conversation
+            for i, msg in enumerate(messages):
+                msg["user_id"] = user_ids[i % 2]
+                msg["username"] = f"User_{i % 2 + 1}"
+
+            # Save modified conversation to a new file
+            job.report(0.5, "Writing simulated log")
+            output_path = room_log_path(user_id, "simulated_room_1")
+            writer = get_writer(output_path)
+            writer.truncate()
+            writer.append_many(messages)
+            writer.flush()
+            return output_path
+
+        def done(output_path):
+            if output_path is None:
+                messagebox.showerror("No Data", "No messages found to simulate.")
+            else:
+                messagebox.showinfo("Simulation Complete", f"Simulated log saved to {output_path}")
+
+        self.jobs.submit("Simulate Conversation", work, on_done=done, on_error=self.show_job_error)
+
+    def import_chat_export(self):
+        filename = filedialog.askopenfilename(title="Import Chat Export",
+                                              filetypes=[("Chat exports", "*.jsonl *.json *.csv"), ("All files", "*")])
+        if not filename:
             return
+        user_id = getattr(self, "fake_user_id", "bypass_local_mode")
+        room = self.current_room
+
+        def work(job):
+            stats = import_chat_export(filename, user_id, room, progress=job.report)
+            job.report(0.9, "Updating profiles")
+            update_room_profiles(stats["path"])
+            return stats
 
-        # Define synthetic user IDs for simulation
-        user_ids = [
-            user_id + "_A",
-            user_id + "_B"
-        ]
+        def done(stats):
+            if room == self.current_room:
+                self.chat_view.open(stats["path"])
+            messagebox.showinfo("Import Complete",
+                                f"Imported {stats['imported']} messages into {room} "
+                                f"({stats['duplicates']} already there, {stats['skipped']} unreadable).")
 
-        # Apply alternating user IDs to simulate a conversation
-        for i, msg in enumerate(messages):
-            msg["user_id"] = user_ids[i % 2]
-            msg["username"] = f"User_{i % 2 + 1}"
+        self.jobs.submit("Import Chat Export", work, on_done=done, on_error=self.show_job_error)
 
-        # Save modified conversation to a new file
-        output_folder = os.path.join("memory_logs", f"user_{user_id}")
-        os.makedirs(output_folder, exist_ok=True)
-        output_path = os.path.join(output_folder, "simulated_room_1_log.jsonl")
+    def show_radar_chart(self, user_id, room):
+        def work(job):
+            return build_radar_figure(user_id, room, progress=job.report)
 
-        with open(output_path, "w") as f:
-            for msg in messages:
-                f.write(json.dumps(msg) + "\n")
+        def done(fig):
+            if fig is None:
+                messagebox.showerror("No Data", "No data to visualize.")
+            else:
+                self.show_figure(fig, f"Bias Radar: {user_id[:8]}")
 
-        messagebox.showinfo("Simulation Complete", f"Simulated log saved to {output_path}")
+        self.jobs.submit("Radar Chart", work, on_done=done, on_error=self.show_job_error)
 
     def run_bias_chart(self):
         user_id = getattr(self, "fake_user_id", "bypass_local_mode")
@@ -343,7 +587,7 @@ class ChatApp:
         else:
             room = "room_1"
 
-        plot_radar_chart(user_id, room=room)
+        self.show_radar_chart(user_id, room)
 
     def export_bias_csv(self):
         user_id = getattr(self, "fake_user_id", "bypass_local_mode")
@@ -352,48 +596,81 @@ class ChatApp:
             room = "simulated_room_1"
         else:
             room = "room_1"
+        filename = f"user_{user_id[:8]}_bias_profile.csv"
 
-        df = analyze_user_bias(user_id, room=room)
-        if df.empty:
-            messagebox.showerror("Export Failed", "No bias data found.")
-            return
+        def work(job):
+            df = analyze_user_bias(user_id, room=room, progress=job.report)
+            if df.empty:
+                return None
+            df.to_csv(filename)
+            return filename
+
+        def done(result):
+            if result is None:
+                messagebox.showerror("Export Failed", "No bias data found.")
+            else:
+                messagebox.showinfo("Export Complete", f"Saved to {filename}")
+
+        self.jobs.submit("Export Bias CSV", work, on_done=done, on_error=self.show_job_error)
+
+    def populate_user_selector(self, rebuild=False):
+        # In a job: the first run (and a rebuild) indexes every log under memory_logs
+        def work(job):
+            if rebuild:
+                rebuild_catalogue()
+            return room_users("simulated_room_1")
+
+        def done(users_sorted):
+            self.user_dropdown["values"] = users_sorted
+            if users_sorted:
+                self.user_dropdown.set(users_sorted[0])
+            elif rebuild:
+                messagebox.showerror("No Users", "No users found in any simulated_room_1 log.")
+
+        self.jobs.submit("Reload User List" if rebuild else "Loading users", work, on_done=done,
+                         on_error=self.show_job_error)
+
+    def reload_user_list(self):
+        # Rescans memory_logs for logs added behind the app's back (copied in, other tools)
+        self.populate_user_selector(rebuild=True)
 
-        filename = f"user_{user_id[:8]}_bias_profile.csv"
-        df.to_csv(filename)
-        messagebox.showinfo("Export Complete", f"Saved to {filename}")
-
-    def populate_user_selector(self):
-        path = r"C:\Users\12817\PycharmProjects\omni\memory_logs\user_6775c0c173a62b664b61a91fc910811d52de811c6d350f8492aa2f1081e0a859\simulated_room_1_log.jsonl"
-        if not os.path.exists(path):
-            messagebox.showerror("Missing File", f"Log not found at:\n{path}")
-            self.user_dropdown["values"] = []
+    def show_selected_user_chart(self):
+        selected_user = self.user_dropdown.get()
+        if not selected_user:
+            messagebox.showwarning("No User Selected", "Please select a user.")
             return
+        self.show_radar_chart(selected_user, "simulated_room_1")
 
-        seen_users = set()
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    msg = json.loads(line.strip())
-                    seen_users.add(msg.get("user_id"))
-                except Exception as e:
-                    print(f"Parse error: {e}")
-                    continue
-
-        users_sorted = sorted(seen_users)
-        self.user_dropdown["values"] = users_sorted
-        if users_sorted:
-            self.user_dropdown.set(users_sorted[0])
+    def show_trend_chart(self, user_id, room, resolution="day", window=7):
+        def work(job):
+            return build_trend_figure(user_id, room, resolution, window, progress=job.report)
 
-    def show_selected_user_chart(self):
+        def done(fig):
+            if fig is None:
+                messagebox.showerror("No Data", "No data to visualize.")
+            else:
+                self.show_figure(fig, f"Bias Trend: {user_id[:8]}")
+
+        self.jobs.submit("Trend Chart", work, on_done=done, on_error=self.show_job_error)
+
+    def show_selected_user_trend(self):
         selected_user = self.user_dropdown.get()
         if not selected_user:
             messagebox.showwarning("No User Selected", "Please select a user.")
             return
-        plot_radar_chart(selected_user, room="simulated_room_1")
+        self.show_trend_chart(selected_user, "simulated_room_1")
 
     def average_bias_chart(self):
-        from bias_analyzer import plot_average_bias_chart
-        plot_average_bias_chart(room="simulated_room_1")
+        def work(job):
+            return build_average_bias_figure(room="simulated_room_1", progress=job.report)
+
+        def done(fig):
+            if fig is None:
+                messagebox.showerror("No Data", "No user data found.")
+            else:
+                self.show_figure(fig, "Average Bias Radar")
+
+        self.jobs.submit("Average Bias Chart", work, on_done=done, on_error=self.show_job_error)
 
 
 # Run the app
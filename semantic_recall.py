@@ -1 +1,473 @@
+import os
+import json
+import math
+import zlib
+import threading
+from collections import Counter
+from functools import lru_cache
 
+import numpy as np
+
+import log_store
+from log_store import room_log_path, iter_chunks, iter_range, read_at
+from embed_input import tokenize
+
+EMBED_DIM = 256
+STORE_VERSION = 1
+SEARCH_BLOCK = 1 << 16
+
+# IVF defaults: lists are trained once a log has ANN_MIN_ROWS embedded messages
+ANN_NLIST = 256
+ANN_PQ_M = 32
+ANN_NPROBE = 32
+ANN_MIN_ROWS = 20000
+ANN_TRAIN_SAMPLE = 100000
+ANN_PQ_TRAIN_SAMPLE = 25000
+ANN_SAVE_EVERY = 10000
+ANN_REFINE = 16
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_slot(token):
+    # crc32 is stable across processes (unlike hash()), so stored vectors stay valid
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % EMBED_DIM, 1.0 if h & 0x80000000 else -1.0
+
+
+def embed_texts(texts):
+    # Signed hashed bag-of-words over the stopword-filtered tokens, sublinear tf,
+    # L2-normalized so a dot product is a cosine similarity
+    vectors = np.zeros((len(texts), EMBED_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for token, n in Counter(tokenize(text)).items():
+            slot, sign = _token_slot(token)
+            vectors[i, slot] += sign * (1.0 + math.log(n))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed_text(text):
+    return embed_texts([text])[0]
+
+
+class EmbeddingStore:
+    # Rows live in three appendable raw arrays next to the log (vectors, log byte
+    # offsets, user codes); <room>_log.emb.json records how much of the log they cover
+    def __init__(self, path):
+        self.path = path
+        base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+        self.vectors_path = base + ".emb.f32"
+        self.offsets_path = base + ".emb.offsets"
+        self.users_path = base + ".emb.users"
+        self.meta_path = base + ".emb.json"
+        self.lock = threading.RLock()
+        self.meta = self._read_meta()
+        self.user_codes = {uid: i for i, uid in enumerate(self.meta["users"])}
+        self._arrays = None
+        self.ann = None
+        self.ann_saved = 0
+
+    def _new_meta(self):
+        return {"version": STORE_VERSION, "dim": EMBED_DIM, "size": 0, "head": None, "rows": 0, "users": []}
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return self._new_meta()
+        if meta.get("version") != STORE_VERSION or meta.get("dim") != EMBED_DIM:
+            return self._new_meta()
+        return meta
+
+    def _write_meta(self):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def _reset(self):
+        self.meta = self._new_meta()
+        self.user_codes = {}
+        self._arrays = None
+        self.ann = None
+        self.ann_saved = 0
+        for p in (self.vectors_path, self.offsets_path, self.users_path, self.ann_path()):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def _trim(self):
+        # Drop rows written after the last meta update (e.g. an interrupted append)
+        rows = self.meta["rows"]
+        for p, width in ((self.vectors_path, 4 * EMBED_DIM), (self.offsets_path, 8), (self.users_path, 4)):
+            if os.path.exists(p) and os.path.getsize(p) > rows * width:
+                with open(p, "r+b") as f:
+                    f.truncate(rows * width)
+
+    def update(self):
+        with self.lock:
+            index = log_store.update_index(self.path)
+            meta = self.meta
+            if meta["size"] > index["size"] or (meta["size"] and meta["head"] != index["head"]):
+                self._reset()
+                meta = self.meta
+            if meta["size"] >= index["size"]:
+                return self
+
+            self._trim()
+            messages = iter_range(self.path, meta["size"], index["size"], with_offsets=True)
+            with open(self.vectors_path, "ab") as vf, open(self.offsets_path, "ab") as of, \
+                    open(self.users_path, "ab") as uf:
+                for chunk in iter_chunks(messages, 4096):
+                    vectors = embed_texts([msg.get("content", "") for offset, msg in chunk])
+                    offsets = np.array([offset for offset, msg in chunk], dtype=np.int64)
+                    codes = np.array([self._user_code(msg.get("user_id")) for offset, msg in chunk],
+                                     dtype=np.int32)
+                    vf.write(vectors.tobytes())
+                    of.write(offsets.tobytes())
+                    uf.write(codes.tobytes())
+                    meta["rows"] += len(chunk)
+
+            meta["size"] = index["size"]
+            meta["head"] = index["head"]
+            self._write_meta()
+            self._arrays = None
+            return self
+
+    def _user_code(self, user_id):
+        if user_id is None:
+            return -1
+        code = self.user_codes.get(user_id)
+        if code is None:
+            code = len(self.meta["users"])
+            self.meta["users"].append(user_id)
+            self.user_codes[user_id] = code
+        return code
+
+    def arrays(self):
+        with self.lock:
+            rows = self.meta["rows"]
+            if self._arrays is None or len(self._arrays[0]) != rows:
+                if not rows:
+                    empty = (np.zeros((0, EMBED_DIM), dtype=np.float32), np.zeros(0, dtype=np.int64),
+                             np.zeros(0, dtype=np.int32))
+                    return empty
+                self._arrays = (
+                    np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, EMBED_DIM)),
+                    np.memmap(self.offsets_path, dtype=np.int64, mode="r", shape=(rows,)),
+                    np.memmap(self.users_path, dtype=np.int32, mode="r", shape=(rows,)),
+                )
+            return self._arrays
+
+    def search(self, query, k=5, user_id=None):
+        if k <= 0:
+            return []
+        vectors, offsets, users = self.arrays()
+        code = None
+        if user_id is not None:
+            code = self.user_codes.get(user_id)
+            if code is None:
+                return []
+
+        best_rows = []
+        best_scores = []
+        for start in range(0, len(vectors), SEARCH_BLOCK):
+            scores = vectors[start:start + SEARCH_BLOCK] @ query
+            if code is not None:
+                scores[users[start:start + SEARCH_BLOCK] != code] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        if not best_rows:
+            return []
+
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:k]
+        # Zero (or masked-out) similarity means no shared vocabulary, so it is not a recall
+        return [(int(rows[i]), float(scores[i])) for i in order if scores[i] > 0]
+
+    def messages(self, rows):
+        vectors, offsets, users = self.arrays()
+        return read_at(self.path, [int(offsets[row]) for row in rows])
+
+    def ann_path(self):
+        return self.meta_path[:-len(".emb.json")] + ".ivf.npz"
+
+    def update_ann(self, min_rows=ANN_MIN_ROWS):
+        # Trains once the log is big enough, then only adds rows past ann.ntotal; the
+        # npz is rewritten every ANN_SAVE_EVERY rows since missing rows are re-added on load
+        with self.lock:
+            ann = self.ann
+            if ann is None and os.path.exists(self.ann_path()):
+                ann = IVFIndex.load(self.ann_path())
+                self.ann_saved = ann.ntotal
+                if ann.ntotal > self.meta["rows"]:
+                    ann = None
+            vectors, offsets, users = self.arrays()
+            if ann is None:
+                if len(vectors) < min_rows:
+                    return None
+                ann = IVFIndex().train(vectors)
+                self.ann_saved = 0
+            if ann.ntotal < len(vectors):
+                for start in range(ann.ntotal, len(vectors), SEARCH_BLOCK):
+                    block = np.asarray(vectors[start:start + SEARCH_BLOCK])
+                    ann.add(block, np.arange(start, start + len(block)))
+            if ann.ntotal - self.ann_saved >= ANN_SAVE_EVERY or not os.path.exists(self.ann_path()):
+                ann.save(self.ann_path())
+                self.ann_saved = ann.ntotal
+            self.ann = ann
+            return ann
+
+    def search_ann(self, query, k=5, user_id=None, nprobe=ANN_NPROBE):
+        ann = self.update_ann()
+        if ann is None:
+            return self.search(query, k, user_id)
+        vectors, offsets, users = self.arrays()
+        if user_id is None:
+            ids, scores = ann.search(query, k, nprobe, vectors)
+        else:
+            code = self.user_codes.get(user_id)
+            if code is None:
+                return []
+            rows = np.flatnonzero(np.asarray(users) == code)
+            # Below the size where a whole log gets an index, scoring the user's rows
+            # directly is both exact and cheaper than probing lists for them
+            if len(rows) < ANN_MIN_ROWS:
+                return self._search_rows(query, k, rows)
+            ids, scores = ann.search(query, k, nprobe, vectors, users=users, user_code=code)
+        return [(int(i), float(s)) for i, s in zip(ids, scores) if s > 0]
+
+    def _search_rows(self, query, k, rows):
+        vectors, offsets, users = self.arrays()
+        scores = np.asarray(vectors[rows]) @ query
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def kmeans(x, k, iters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        assign = nearest_centroid(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(k + 1))
+        counts = np.diff(bounds)
+        filled = counts > 0
+        # One reduceat over the points sorted by cluster instead of a scattered add
+        sums = np.add.reduceat(x[order], bounds[:-1][filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        # Re-seed empty clusters from random points rather than letting them die
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()), replace=False)]
+    return centroids
+
+
+def nearest_centroid(x, centroids, block=16384):
+    c_norms = (centroids ** 2).sum(axis=1)
+    assign = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block):
+        distances = c_norms - 2 * (x[start:start + block] @ centroids.T)
+        assign[start:start + block] = distances.argmin(axis=1)
+    return assign
+
+
+class IVFIndex:
+    # Inverted-file index over the embedding rows: a k-means coarse quantizer picks
+    # nprobe lists to scan. With pq_m > 0 each residual is product-quantized into
+    # pq_m uint8 codes and scored from a lookup table; with pq_m == 0 the lists only
+    # hold row ids and candidates are scored against the store's float32 vectors.
+    def __init__(self, dim=EMBED_DIM, nlist=ANN_NLIST, pq_m=ANN_PQ_M):
+        if pq_m and dim % pq_m:
+            raise ValueError(f"dim {dim} is not divisible by pq_m {pq_m}")
+        self.dim = dim
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.centroids = None
+        self.codebooks = None
+        self.ntotal = 0
+        self.list_ids = [[] for _ in range(nlist)]
+        self.list_codes = [[] for _ in range(nlist)]
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        if len(vectors) > ANN_TRAIN_SAMPLE:
+            vectors = vectors[np.sort(rng.choice(len(vectors), ANN_TRAIN_SAMPLE, replace=False))]
+        self.nlist = min(self.nlist, len(vectors))
+        self.list_ids = [[] for _ in range(self.nlist)]
+        self.list_codes = [[] for _ in range(self.nlist)]
+        self.centroids = kmeans(vectors, self.nlist, seed=seed)
+
+        if self.pq_m:
+            if len(vectors) > ANN_PQ_TRAIN_SAMPLE:
+                vectors = vectors[rng.choice(len(vectors), ANN_PQ_TRAIN_SAMPLE, replace=False)]
+            residuals = vectors - self.centroids[nearest_centroid(vectors, self.centroids)]
+            dsub = self.dim // self.pq_m
+            ksub = min(256, len(vectors))
+            self.codebooks = np.stack([
+                kmeans(np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub]), ksub, iters=10, seed=seed + j)
+                for j in range(self.pq_m)
+            ])
+        return self
+
+    def _encode(self, residuals):
+        dsub = self.dim // self.pq_m
+        codes = np.empty((len(residuals), self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            sub = np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub])
+            codes[:, j] = nearest_centroid(sub, self.codebooks[j])
+        return codes
+
+    def add(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        assign = nearest_centroid(vectors, self.centroids)
+        codes = self._encode(vectors - self.centroids[assign]) if self.pq_m else None
+
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+        for lst in np.flatnonzero(np.diff(bounds)):
+            members = order[bounds[lst]:bounds[lst + 1]]
+            self.list_ids[lst].append(ids[members])
+            if codes is not None:
+                self.list_codes[lst].append(codes[members])
+        self.ntotal += len(ids)
+
+    def _list(self, lst):
+        # Incremental adds leave each list as several chunks; merge them on first read
+        if len(self.list_ids[lst]) > 1:
+            self.list_ids[lst] = [np.concatenate(self.list_ids[lst])]
+            if self.pq_m:
+                self.list_codes[lst] = [np.concatenate(self.list_codes[lst])]
+        if not self.list_ids[lst]:
+            return np.zeros(0, dtype=np.int64), None
+        return self.list_ids[lst][0], self.list_codes[lst][0] if self.pq_m else None
+
+    def search(self, query, k=5, nprobe=ANN_NPROBE, vectors=None, refine=ANN_REFINE, users=None, user_code=None):
+        # With users (a code per row id) only rows of user_code are candidates; they are
+        # masked inside each list, and more lists are probed past nprobe until k are found
+        # (the same goes without a filter, for queries whose first lists hold too few)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self.centroids @ query
+        probe = np.argsort(-coarse)
+
+        if self.pq_m:
+            dsub = self.dim // self.pq_m
+            lut = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(self.pq_m, dsub))
+            columns = np.arange(self.pq_m)
+
+        ids_parts = []
+        score_parts = []
+        found = 0
+        for probed, lst in enumerate(probe):
+            if probed >= nprobe and found >= k:
+                break
+            ids, codes = self._list(lst)
+            if users is not None and len(ids):
+                keep = np.asarray(users[ids]) == user_code
+                ids = ids[keep]
+                codes = codes[keep] if codes is not None else None
+            if not len(ids):
+                continue
+            if self.pq_m and (users is None or vectors is None):
+                scores = coarse[lst] + lut[columns, codes].sum(axis=1)
+            else:
+                # One user's share of a list is small enough to score exactly
+                scores = np.asarray(vectors[ids]) @ query
+            # Zero similarity is no recall, so only candidates sharing some vocabulary count
+            found += int((scores > 0).sum())
+            ids_parts.append(ids)
+            score_parts.append(scores)
+        if not ids_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        ids = np.concatenate(ids_parts)
+        scores = np.concatenate(score_parts)
+        # PQ scores are approximate: keep a few times k and rescore those exactly if we can
+        exact = vectors is not None and (not self.pq_m or users is not None)
+        keep = k if exact else k * refine if vectors is not None else k
+        if len(ids) > keep:
+            top = np.argpartition(-scores, keep - 1)[:keep]
+            ids, scores = ids[top], scores[top]
+        if not exact and vectors is not None:
+            order = np.argsort(ids)
+            ids = ids[order]
+            scores = np.asarray(vectors[ids]) @ query
+        order = np.argsort(-scores, kind="stable")[:k]
+        return ids[order], scores[order]
+
+    def save(self, path):
+        ids = [self._list(lst)[0] for lst in range(self.nlist)]
+        starts = np.concatenate([[0], np.cumsum([len(x) for x in ids])]).astype(np.int64)
+        arrays = {
+            "params": np.array([self.dim, self.nlist, self.pq_m, self.ntotal], dtype=np.int64),
+            "centroids": self.centroids,
+            "starts": starts,
+            "ids": np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64),
+        }
+        if self.pq_m:
+            arrays["codebooks"] = self.codebooks
+            codes = [self._list(lst)[1] for lst in range(self.nlist)]
+            codes = [c if c is not None else np.zeros((0, self.pq_m), dtype=np.uint8) for c in codes]
+            arrays["codes"] = np.concatenate(codes)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            dim, nlist, pq_m, ntotal = (int(v) for v in data["params"])
+            index = cls(dim, nlist, pq_m)
+            index.centroids = data["centroids"]
+            index.ntotal = ntotal
+            starts = data["starts"]
+            ids = data["ids"]
+            codes = data["codes"] if pq_m else None
+            if pq_m:
+                index.codebooks = data["codebooks"]
+        for lst in range(nlist):
+            lo, hi = starts[lst], starts[lst + 1]
+            if hi > lo:
+                index.list_ids[lst].append(ids[lo:hi])
+                if pq_m:
+                    index.list_codes[lst].append(codes[lo:hi])
+        return index
+
+
+def get_store(path):
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = EmbeddingStore(path)
+            _stores[path] = store
+    return store
+
+
+def update_recall_index(path):
+    store = get_store(path).update()
+    store.update_ann()
+    return store
+
+
+def recall(user_id, query, k=5, room="room_1", path=None, approximate=False, nprobe=ANN_NPROBE):
+    store = get_store(path or room_log_path(user_id, room)).update()
+    if approximate:
+        hits = store.search_ann(embed_text(query), k, user_id, nprobe)
+    else:
+        hits = store.search(embed_text(query), k, user_id)
+    messages = store.messages([row for row, score in hits])
+    return [(score, msg) for (row, score), msg in zip(hits, messages)]
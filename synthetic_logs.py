@@ -0,0 +1,119 @@
+import argparse
+import hashlib
+import math
+import os
+import random
+
+import log_store
+from embed_input import generate_memory_node, load_stopwords
+from log_store import LogWriter
+
+LENGTH_DISTRIBUTIONS = ("lognormal", "uniform", "fixed")
+START_TIME = 1735689600
+FILLER = ["i", "you", "we", "they", "it", "is", "was", "not", "so", "just", "really", "think", "know", "like"]
+
+
+def owner_id(seed):
+    return hashlib.sha256(f"synthetic-{seed}".encode("utf-8")).hexdigest()
+
+
+def user_ids(owner, users):
+    # Same shape as simulate_conversation's "<owner>_A" ids
+    return [f"{owner}_{i}" for i in range(users)]
+
+
+def build_vocabulary():
+    # Empath terms so the bias pipeline has something to score, plus stopwords and
+    # filler the word-profile code has to skip over
+    from bias_analyzer import get_lexicon
+    terms = sorted({t for words in get_lexicon().cats.values() for t in words})
+    return terms + sorted(load_stopwords()) + FILLER
+
+
+def message_lengths(rng, n, distribution, mean_words, sigma):
+    if distribution == "fixed":
+        return [mean_words] * n
+    if distribution == "uniform":
+        return [rng.randint(1, 2 * mean_words - 1) for _ in range(n)]
+    # lognormal with the requested mean: mu = ln(mean) - sigma^2 / 2
+    mu = math.log(mean_words) - sigma ** 2 / 2
+    return [max(1, int(round(rng.lognormvariate(mu, sigma)))) for _ in range(n)]
+
+
+def generate_room_log(path, room, users, messages_per_user, vocabulary, distribution="lognormal",
+                      mean_words=20, sigma=0.6, seed=0, start_time=START_TIME, mean_gap=90,
+                      batch_size=10000):
+    rng = random.Random(f"{seed}-{room}")
+    # Zipf-like word frequencies: a few common words, a long tail of rare ones
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    shuffled = vocabulary[:]
+    rng.shuffle(shuffled)
+    cum_weights = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cum_weights.append(total)
+
+    names = {uid: f"User_{i + 1}" for i, uid in enumerate(users)}
+    # Interleave users like a conversation: every user gets exactly messages_per_user turns
+    speakers = [uid for uid in users for _ in range(messages_per_user)]
+    rng.shuffle(speakers)
+    lengths = message_lengths(rng, len(speakers), distribution, mean_words, sigma)
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    writer = LogWriter(path, flush_lines=batch_size)
+    writer.truncate()
+    timestamp = start_time
+    batch = []
+    for i, (uid, length) in enumerate(zip(speakers, lengths)):
+        words = rng.choices(shuffled, cum_weights=cum_weights, k=length)
+        # A serial number keeps every message (and so every message id) unique
+        node = generate_memory_node(uid, names[uid], room, " ".join(words) + f" #{i}")
+        timestamp += int(rng.expovariate(1.0 / mean_gap)) + 1
+        node["timestamp"] = timestamp
+        batch.append(node)
+        if len(batch) >= batch_size:
+            writer.append_many(batch)
+            batch = []
+    writer.append_many(batch)
+    writer.close()
+    return len(speakers)
+
+
+def generate_logs(log_path=None, users=4, messages_per_user=250, rooms=("room_1",), distribution="lognormal",
+                  mean_words=20, sigma=0.6, seed=0):
+    # Writes <log_path>/user_<owner>/<room>_log.jsonl for each room, all users in one log
+    log_path = log_path or log_store.LOG_PATH
+    owner = owner_id(seed)
+    ids = user_ids(owner, users)
+    vocabulary = build_vocabulary()
+    written = {}
+    for room in rooms:
+        path = os.path.join(log_path, f"user_{owner}", f"{room}_log.jsonl")
+        written[path] = generate_room_log(path, room, ids, messages_per_user, vocabulary, distribution,
+                                          mean_words, sigma, seed)
+    return ids, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="write synthetic memory logs with the memory node schema")
+    parser.add_argument("--log-path", default=log_store.LOG_PATH)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--messages-per-user", type=int, default=250)
+    parser.add_argument("--rooms", nargs="+", default=["room_1"])
+    parser.add_argument("--length-dist", choices=LENGTH_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--mean-words", type=int, default=20)
+    parser.add_argument("--sigma", type=float, default=0.6, help="lognormal shape")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ids, written = generate_logs(args.log_path, args.users, args.messages_per_user, args.rooms,
+                                 args.length_dist, args.mean_words, args.sigma, args.seed)
+    for path, count in written.items():
+        print(f"{path}: {count} messages from {len(ids)} users")
+
+
+if __name__ == "__main__":
+    main()
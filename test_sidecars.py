@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+
+import bias_analyzer
+import bias_trends
+import log_store
+from embed_input import generate_memory_nodes
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USERS = ["u1", "u2", "u3", "u4"]
+WORDS = ["happy", "angry", "money", "family", "war", "music", "love", "fear", "work", "food", "travel", "sad"]
+
+# Each fold runs in its own process, so everything the next one sees comes off disk
+FOLD = ("import sys, bias_analyzer, bias_trends; "
+        "bias_analyzer.update_room_profiles(sys.argv[1]); bias_trends.update_room_trends(sys.argv[1])")
+
+
+def _lines(start, count, shift=0):
+    messages = []
+    for i in range(start, start + count):
+        words = [WORDS[(i * 7 + j * 3 + shift) % len(WORDS)] for j in range(3 + i % 4)]
+        messages.append({"user_id": USERS[(i + shift) % len(USERS)], "username": "User",
+                         "timestamp": 1700000000 + i * 1500, "content": f"message {i} " + " ".join(words)})
+    nodes = generate_memory_nodes(messages)
+    return "".join(json.dumps(node) + "\n" for node in nodes).encode("utf-8")
+
+
+def _append(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def _fold(path):
+    subprocess.run([sys.executable, "-c", FOLD, path], cwd=HERE, check=True)
+
+
+def _reload(path):
+    log_store._loaded_indexes.clear()
+    bias_analyzer._room_profiles.clear()
+    bias_trends._room_trends.clear()
+    return (log_store._read_index(path), bias_analyzer._read_profiles(path),
+            bias_trends.TrendBuckets.load(path, bias_analyzer.get_categories()))
+
+
+def _scratch(path, tmp_path):
+    folder = tmp_path / f"scratch_{len(os.listdir(tmp_path))}"
+    folder.mkdir()
+    copy = str(folder / os.path.basename(path))
+    shutil.copyfile(path, copy)
+    _fold(copy)
+    return _reload(copy)
+
+
+def _assert_same(path, tmp_path):
+    index, profiles, trends = _reload(path)
+    fresh_index, fresh_profiles, fresh_trends = _scratch(path, tmp_path)
+
+    for key in ("size", "head", "sorted", "last_ts", "blocks", "users", "codes"):
+        assert index[key] == fresh_index[key], key
+
+    assert profiles["size"] == fresh_profiles["size"] == index["size"]
+    assert profiles["head"] == fresh_profiles["head"]
+    assert profiles["users"].keys() == fresh_profiles["users"].keys()
+    for uid, profile in profiles["users"].items():
+        for key, value in profile.items():
+            assert np.allclose(value, fresh_profiles["users"][uid][key]), (uid, key)
+
+    assert trends.size == fresh_trends.size == index["size"]
+    assert trends.head == fresh_trends.head
+    assert trends.users == fresh_trends.users
+    for mine, theirs in zip(trends.bucket_keys + trends.cell_keys, fresh_trends.bucket_keys + fresh_trends.cell_keys):
+        assert np.array_equal(mine, theirs)
+    for mine, theirs in zip(trends.buckets + trends.cells, fresh_trends.buckets + fresh_trends.cells):
+        assert np.allclose(mine, theirs)
+    return profiles
+
+
+def _base_id(path):
+    with open(bias_analyzer.profiles_path(path), "r", encoding="utf-8") as f:
+        return json.load(f)["base"]
+
+
+def test_appended_chunks_match_fresh_fold(tmp_path):
+    folder = tmp_path / "room"
+    folder.mkdir()
+    path = str(folder / "room_1_log.jsonl")
+
+    _append(path, _lines(0, 40))
+    _fold(path)
+    bases = [_base_id(path)]
+    start = 40
+    for count in (5, 12, 3, 30, 8):
+        data = _lines(start, count)
+        # The last line lands torn first and is only folded once it is finished
+        size = os.path.getsize(path)
+        _append(path, data[:-20])
+        _fold(path)
+        assert _reload(path)[0]["size"] == size + data[:-20].rfind(b"\n") + 1
+        _append(path, data[-20:])
+        _fold(path)
+        bases.append(_base_id(path))
+        start += count
+        _assert_same(path, tmp_path)
+    # Small appends go to the journal and the base is rewritten once the journal
+    # outgrows it; whatever the journal holds then replays against the new base
+    assert len(set(bases)) > 1
+    assert _reload(path)[1]["journal"] == os.path.getsize(bias_analyzer.profiles_journal_path(path))
+
+
+def test_torn_journal_and_sidecar_tails(tmp_path):
+    folder = tmp_path / "room"
+    folder.mkdir()
+    path = str(folder / "room_1_log.jsonl")
+    _append(path, _lines(0, 40))
+    _fold(path)
+    _append(path, _lines(40, 4))
+    _fold(path)
+    journal = bias_analyzer.profiles_journal_path(path)
+    assert os.path.getsize(journal)
+
+    # An update that died mid-write leaves a torn journal line and sidecar entries past
+    # the header's counts; readers ignore them
+    before = _reload(path)
+    with open(journal, "ab") as f:
+        f.write(b'{"base":"' + _base_id(path).encode() + b'","size":99999,"users":{"u1"')
+    _append(log_store.offsets_path(path), np.array([(0, 12345)], dtype=log_store.OFFSET_RECORD).tobytes())
+    _append(log_store.index_users_path(path), b'"ghost"\n')
+    after = _reload(path)
+    assert after[0]["users"] == before[0]["users"]
+    assert after[1]["size"] == before[1]["size"]
+    assert after[1]["users"] == before[1]["users"]
+
+    # ...and the next update writes over them
+    _append(path, _lines(44, 4))
+    _fold(path)
+    with open(journal, "rb") as f:
+        assert all(json.loads(line) for line in f)
+    _assert_same(path, tmp_path)
+
+    # Lines written against another base are not replayed
+    before = _reload(path)
+    with open(journal, "ab") as f:
+        f.write(json.dumps({"base": "stale", "size": 1, "head": None, "users": {"u1": {}}}).encode() + b"\n")
+    after = _reload(path)
+    assert after[1]["size"] == before[1]["size"]
+    assert after[1]["users"] == before[1]["users"]
+
+
+def test_rewritten_log_starts_over(tmp_path):
+    folder = tmp_path / "room"
+    folder.mkdir()
+    path = str(folder / "room_1_log.jsonl")
+    _append(path, _lines(0, 40))
+    _fold(path)
+    _append(path, _lines(40, 5))
+    _fold(path)
+
+    # Longer than before but with a different first line
+    with open(path, "wb") as f:
+        f.write(_lines(0, 60, shift=1))
+    _fold(path)
+    profiles = _assert_same(path, tmp_path)
+    assert sum(p["messages"] for p in profiles["users"].values()) == 60
+
+    # Shorter than before
+    with open(path, "wb") as f:
+        f.write(_lines(0, 10, shift=2))
+    _fold(path)
+    profiles = _assert_same(path, tmp_path)
+    assert sum(p["messages"] for p in profiles["users"].values()) == 10